@@ -0,0 +1,115 @@
+"""
+A MySQL database backend where the aliases on the same server share one connection per thread.
+
+The data aliases in core/settings.py ('spectra', 'spexodisks', 'new_spectra', 'new_spexodisks') are the same MySQL
+server and user, and differ only in the schema. With this backend, a request that reads the metadata and a spectrum
+opens (or, with CONN_MAX_AGE, reuses) a single connection, and each query first switches to the schema of its alias
+when the connection was last used by another alias, a 'USE <schema>' with no new TCP or TLS handshake.
+
+The API only reads from the data aliases, in autocommit mode. Aliases that write in transactions ('default') must keep
+the standard backend, since a transaction on one alias would include the queries of the aliases it shares with.
+This is enforced: an alias with this backend can not be configured with ATOMIC_REQUESTS or without AUTOCOMMIT,
+and atomic() or set_autocommit(False) on it raises TransactionManagementError.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.transaction import TransactionManagementError
+from django.db.backends.mysql import base as mysql_base
+
+shared_state = threading.local()
+
+
+class SharedConnection:
+    """ A raw connection and the aliases that are using it. """
+    def __init__(self, connection, schema: str):
+        self.connection = connection
+        self.schema = schema
+        self.users = 0
+
+
+def shared_connections() -> dict[tuple, SharedConnection]:
+    if not hasattr(shared_state, 'connections'):
+        shared_state.connections = {}
+    return shared_state.connections
+
+
+def connection_key(conn_params: dict) -> tuple:
+    # everything but the schema
+    return tuple(sorted((name, repr(value)) for name, value in conn_params.items() if name not in {'database', 'db'}))
+
+
+def is_usable(connection) -> bool:
+    try:
+        connection.ping()
+    except mysql_base.Database.Error:
+        return False
+    return True
+
+
+class SchemaCursorWrapper(mysql_base.CursorWrapper):
+    """ Switches the shared connection to the schema of the alias before each query. """
+    def __init__(self, cursor, database_wrapper):
+        super().__init__(cursor)
+        self.database_wrapper = database_wrapper
+
+    def execute(self, query, args=None):
+        self.database_wrapper.select_schema()
+        return super().execute(query, args)
+
+    def executemany(self, query, args):
+        self.database_wrapper.select_schema()
+        return super().executemany(query, args)
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    shared = None
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        if settings_dict.get('ATOMIC_REQUESTS', False) or not settings_dict.get('AUTOCOMMIT', True):
+            raise ImproperlyConfigured(f'The database alias "{self.alias}" shares its connection, see '
+                                       f'core/mysql_shared/base.py, it needs AUTOCOMMIT and no ATOMIC_REQUESTS.')
+
+    def set_autocommit(self, autocommit, *args, **kwargs):
+        # atomic() starts its transaction with set_autocommit(False)
+        if not autocommit:
+            raise TransactionManagementError(f'The database alias "{self.alias}" shares its connection with other '
+                                             f'aliases, see core/mysql_shared/base.py, it can not start a transaction.')
+        super().set_autocommit(autocommit, *args, **kwargs)
+
+    def get_new_connection(self, conn_params):
+        key = connection_key(conn_params)
+        connections = shared_connections()
+        shared = connections.get(key)
+        if shared is None or not is_usable(shared.connection):
+            shared = SharedConnection(connection=super().get_new_connection(conn_params),
+                                      schema=conn_params.get('database'))
+            connections[key] = shared
+        shared.users += 1
+        self.shared = shared
+        return shared.connection
+
+    def select_schema(self):
+        schema = self.settings_dict['NAME']
+        if self.shared is not None and self.shared.schema != schema:
+            with self.wrap_database_errors:
+                self.connection.select_db(schema)
+            self.shared.schema = schema
+
+    def create_cursor(self, name=None):
+        return SchemaCursorWrapper(self.connection.cursor(), database_wrapper=self)
+
+    def _close(self):
+        shared, self.shared = self.shared, None
+        if shared is None:
+            return super()._close()
+        shared.users -= 1
+        if shared.users > 0:
+            # still in use by another alias
+            return None
+        connections = shared_connections()
+        for key, connection in list(connections.items()):
+            if connection is shared:
+                del connections[key]
+        return super()._close()
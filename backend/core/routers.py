@@ -0,0 +1,28 @@
+"""
+The database router for the read replicas in core/settings.py (API_REPLICA_HOSTS).
+
+The replica aliases are copies of the data aliases that only MySQL replication writes to, so nothing is migrated
+to them, and an object read from a replica may relate to the objects of its primary alias. The API chooses the alias
+to read from itself, since its querysets name their alias, see djangoAPI/replicas.py.
+"""
+from django.conf import settings
+
+primary_alias_by_replica_alias = {replica_alias: alias
+                                  for alias, replica_aliases in settings.API_REPLICA_ALIASES.items()
+                                  for replica_alias in replica_aliases}
+
+
+def primary_alias(alias: str) -> str:
+    return primary_alias_by_replica_alias.get(alias, alias)
+
+
+class ReplicaRouter:
+    def allow_relation(self, obj1, obj2, **hints):
+        if primary_alias(obj1._state.db) == primary_alias(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in primary_alias_by_replica_alias:
+            return False
+        return None
@@ -17,7 +17,7 @@ from science.db.migrate import do_migration
 from science.db.data_status import get_data_status_mysql
 from science.db.sql import (MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD,
                             sql_port, DEBUG, EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_APP_PASSWORD,
-                            wait_for_mysql_to_start, DATA_MIGRATE_FROM_STAGED)
+                            wait_for_mysql_to_start, DATA_MIGRATE_FROM_STAGED, str_is_true, API_SNAPSHOT_DIR)
 
 
 if not wait_for_mysql_to_start():
@@ -70,6 +70,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'djangoAPI.metrics.RequestMetricsMiddleware',
+    'djangoAPI.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -80,6 +82,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'djangoAPI.middleware.GenerationConditionalMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -109,6 +112,15 @@ data_auth = {
     'PASSWORD': MYSQL_PASSWORD,
     'PORT': sql_port,
     'HOST': MYSQL_HOST,
+    # keep the connections open between requests, and check them before reuse
+    'CONN_MAX_AGE': int(os.environ.get("DJANGO_CONN_MAX_AGE", "600")),
+    'CONN_HEALTH_CHECKS': True,
+}
+# the read-only data aliases share one connection, see core/mysql_shared/base.py
+DJANGO_SHARED_DB_CONNECTION = str_is_true(os.environ.get("DJANGO_SHARED_DB_CONNECTION", "true"))
+data_alias_auth = {
+    **data_auth,
+    'ENGINE': 'core.mysql_shared' if DJANGO_SHARED_DB_CONNECTION else data_auth['ENGINE'],
 }
 DATABASES = {
     'default': {
@@ -117,22 +129,44 @@ DATABASES = {
     },
     'spectra': {
         'NAME': 'spectra',
-        **data_auth,
+        **data_alias_auth,
     },
     'spexodisks': {
         'NAME': 'spexodisks',
-        **data_auth,
+        **data_alias_auth,
     },
     'new_spectra': {
         'NAME': 'new_spectra',
-        **data_auth,
+        **data_alias_auth,
     },
     'new_spexodisks': {
         'NAME': 'new_spexodisks',
-        **data_auth,
+        **data_alias_auth,
     }
 
 }
+# MySQL read replicas for the API, as 'host[:port]' separated by commas. Each replica adds an alias per data alias,
+# such as 'spectra_replica_1', and the API reads from a replica that has the current data generation,
+# see djangoAPI/replicas.py. Nothing is written to the replicas, and the users ('default') stay on the primary.
+API_REPLICA_HOSTS = [host.strip() for host in os.environ.get("API_REPLICA_HOSTS", "").split(',') if host.strip()]
+API_REPLICA_USER = os.environ.get("API_REPLICA_USER", MYSQL_USER)
+API_REPLICA_PASSWORD = os.environ.get("API_REPLICA_PASSWORD", MYSQL_PASSWORD)
+# the replica aliases of each data alias, in the order of API_REPLICA_HOSTS
+API_REPLICA_ALIASES = {alias: [] for alias in ('spectra', 'spexodisks', 'new_spectra', 'new_spexodisks')}
+for replica_number, replica_host in enumerate(API_REPLICA_HOSTS, start=1):
+    replica_hostname, _, replica_port = replica_host.partition(':')
+    for alias, replica_aliases in API_REPLICA_ALIASES.items():
+        replica_alias = f'{alias}_replica_{replica_number}'
+        DATABASES[replica_alias] = {
+            **DATABASES[alias],
+            'HOST': replica_hostname,
+            'PORT': replica_port or sql_port,
+            'USER': API_REPLICA_USER,
+            'PASSWORD': API_REPLICA_PASSWORD,
+            'TEST': {'MIRROR': alias},
+        }
+        replica_aliases.append(replica_alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -230,6 +264,10 @@ DOMAIN = 'localhost:3000'
 SITE_NAME = 'SpExoDisks'
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'djangoAPI.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
@@ -240,11 +278,64 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_RATES': {
         'spectra': '5/min',
+        # bytes of spectra served by the multi-spectrum endpoint
+        'spectra_bytes': '500000000/day',
         'burst': '25/min',
         'sustained': '5000/day'
     }
 }
 
+# Response cache for the read-only endpoints, see djangoAPI/caching.py
+# the size of the in-process tier, per worker
+API_CACHE_MAX_MB = int(os.environ.get("API_CACHE_MAX_MB", "256"))
+# how often each worker checks the database for a new data generation
+API_GENERATION_CHECK_SECONDS = float(os.environ.get("API_GENERATION_CHECK_SECONDS", "60"))
+# Cache-Control max-age of the read-only endpoints for browsers and the nginx proxy cache,
+# stale responses are revalidated with the ETag, see djangoAPI/middleware.py
+API_HTTP_MAX_AGE = int(os.environ.get("API_HTTP_MAX_AGE", "3600"))
+# the shared tier: 'file', 'redis', or 'none'
+API_SHARED_CACHE = os.environ.get("API_SHARED_CACHE", "file").lower()
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if API_SHARED_CACHE == 'file':
+    CACHES['api_shared'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get("API_SHARED_CACHE_LOCATION", "/var/tmp/spexodisks_api_cache"),
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+elif API_SHARED_CACHE == 'redis':
+    CACHES['api_shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get("API_SHARED_CACHE_LOCATION", "redis://127.0.0.1:6379/1"),
+        'TIMEOUT': 60 * 60 * 24 * 7,
+    }
+
+# the bearer token of the Prometheus scraper for /api/metrics/, see djangoAPI/metrics.py, the metrics are
+# not served (403) when this is empty
+API_METRICS_TOKEN = os.environ.get("API_METRICS_TOKEN", "")
+
+# cProfile profiles of API requests, see djangoAPI/profiling.py, staff users can ask for one with 'X-Profile: 1',
+# and this fraction of all requests is profiled, 0.0 for none
+API_PROFILE_SAMPLE_RATE = float(os.environ.get("API_PROFILE_SAMPLE_RATE", "0.0"))
+API_PROFILE_DIR = os.environ.get("API_PROFILE_DIR", "/var/tmp/spexodisks_api_profiles")
+API_PROFILE_MAX_FILES = int(os.environ.get("API_PROFILE_MAX_FILES", "200"))
+
+# Pre-rendered snapshots of the static endpoints for nginx, see djangoAPI/snapshots.py,
+# nginx/deploy.conf reads this directory through the gunicorn_tmp volume. API_SNAPSHOT_DIR is imported from
+# science/db/sql.py above, the migration also uses it. nginx gives the snapshots the max-age of API_HTTP_MAX_AGE.
+
+# Read the spectra from the memory-mapped .npy files that the pipeline writes next to the FITS files,
+# see science/db/spectrum_store.py, spectra without a file with the digest in the manifest are read from MySQL
+API_SPECTRUM_FILES = str_is_true(os.environ.get("API_SPECTRUM_FILES", "true"))
+
+# Cached download archives are sent by nginx when this is set, for example '/protected_downloads/',
+# an internal location in nginx/deploy.conf with an alias to DOWNLOAD_CACHE_DIR
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get("DOWNLOAD_ACCEL_REDIRECT_PREFIX", "")
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=90),
@@ -1,4 +1,4 @@
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.throttling import UserRateThrottle, SimpleRateThrottle
 
 
 class BurstRateThrottle(UserRateThrottle):
@@ -6,4 +6,48 @@ class BurstRateThrottle(UserRateThrottle):
 
 
 class SustainedRateThrottle(UserRateThrottle):
-    scope = 'sustained'
\ No newline at end of file
+    scope = 'sustained'
+
+
+class SpectraBytesThrottle(SimpleRateThrottle):
+    """
+    Limits the number of bytes of spectra served per user (or per IP address for anonymous users).
+    The rate is in bytes, for example '500000000/day'. A request is only refused after the budget is used up,
+    the view reports the size of each response with charge().
+    """
+    scope = 'spectra_bytes'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def load_history(self, request, view):
+        self.key = self.get_cache_key(request, view)
+        self.history = self.cache.get(self.key, [])
+        self.now = self.timer()
+        # the history is a list of (timestamp, bytes) with the newest first
+        while self.history and self.history[-1][0] <= self.now - self.duration:
+            self.history.pop()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.load_history(request, view)
+        if sum(num_bytes for _timestamp, num_bytes in self.history) >= self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def charge(self, request, view, num_bytes: int):
+        if self.rate is None:
+            return
+        self.load_history(request, view)
+        self.history.insert(0, (self.now, num_bytes))
+        self.cache.set(self.key, self.history, self.duration)
+
+    def wait(self):
+        if self.history:
+            return self.duration - (self.now - self.history[-1][0])
+        return None
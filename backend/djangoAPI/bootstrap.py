@@ -0,0 +1,40 @@
+"""
+Documents that are built once per data generation and served as is, such as the bootstrap document of the
+Explore page (views.BootstrapView), which combines the metadata endpoints that the page needs for its first paint.
+
+The JSON is rendered and gzip compressed once, so a request only pays for copying the bytes to the response.
+"""
+import gzip
+from threading import Lock
+from typing import Callable, NamedTuple
+
+from .generation import data_generation
+from .renderers import FastJSONRenderer
+
+
+class RenderedDocument(NamedTuple):
+    json: bytes
+    gzip: bytes
+
+
+def render_document(data: dict) -> RenderedDocument:
+    json_bytes = FastJSONRenderer().render(data)
+    return RenderedDocument(json=json_bytes, gzip=gzip.compress(json_bytes, compresslevel=9, mtime=0))
+
+
+class PrebuiltDocument:
+    """ The rendered output of build() for the current data generation. """
+    def __init__(self, build: Callable[[], dict]):
+        self.build = build
+        self.generation = None
+        self.document = None
+        self.lock = Lock()
+
+    def get(self) -> RenderedDocument:
+        generation = data_generation.current
+        if self.generation != generation:
+            with self.lock:
+                if self.generation != generation:
+                    self.document = render_document(self.build())
+                    self.generation = generation
+        return self.document
@@ -0,0 +1,189 @@
+"""
+Response cache for the read-only endpoints.
+
+The API data only change when a new data generation is migrated, see djangoAPI.generation, so the rendered
+responses are cached with the generation in the key. There are two tiers:
+    local:  a size bounded LRU in each process, cleared when the process sees a new generation.
+    shared: the Django cache named 'api_shared' (file based or Redis, see API_SHARED_CACHE in core/settings.py),
+            shared by all the workers and prefilled by 'python manage.py warm_api_cache'.
+            Old generations are never requested again and expire with the cache timeout.
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.renderers import BrowsableAPIRenderer
+
+from .generation import data_generation
+
+shared_cache_alias = 'api_shared'
+
+
+class CachedResponse(NamedTuple):
+    content: bytes
+    content_type: str
+    status_code: int
+    vary: str | None = None
+
+    def to_response(self) -> HttpResponse:
+        response = HttpResponse(content=self.content, content_type=self.content_type, status=self.status_code)
+        if self.vary is not None:
+            response['Vary'] = self.vary
+        return response
+
+
+class LRUCache:
+    """ A thread safe least-recently-used cache bounded by the total size of the values in bytes. """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes // 4
+        self.items = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key][0]
+
+    def set(self, key: str, value, num_bytes: int):
+        if num_bytes > self.max_item_bytes:
+            return
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self.items.pop(key)[1]
+            self.items[key] = (value, num_bytes)
+            self.total_bytes += num_bytes
+            while self.total_bytes > self.max_bytes:
+                _oldest_key, (_oldest_value, oldest_bytes) = self.items.popitem(last=False)
+                self.total_bytes -= oldest_bytes
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.total_bytes = 0
+
+
+class ApiCache:
+    """ The local LRU tier in front of the optional shared tier. """
+    def __init__(self, max_bytes: int, use_shared: bool):
+        self.local = LRUCache(max_bytes=max_bytes)
+        self.use_shared = use_shared
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def get(self, key: str) -> CachedResponse | None:
+        cached = self.local.get(key)
+        if cached is None and self.use_shared:
+            cached = caches[shared_cache_alias].get(key)
+            if cached is None:
+                self.shared_misses += 1
+            else:
+                self.shared_hits += 1
+                cached = CachedResponse(*cached)
+                self.local.set(key, cached, num_bytes=len(cached.content))
+        return cached
+
+    def set(self, key: str, cached: CachedResponse):
+        self.local.set(key, cached, num_bytes=len(cached.content))
+        if self.use_shared:
+            caches[shared_cache_alias].set(key, tuple(cached))
+
+    def clear_local(self, _generation: int = None):
+        self.local.clear()
+
+
+api_cache = ApiCache(max_bytes=settings.API_CACHE_MAX_MB * 2 ** 20,
+                     use_shared=shared_cache_alias in settings.CACHES)
+data_generation.on_change.append(api_cache.clear_local)
+
+
+def sorted_query(query_dict, exclude: tuple[str, ...] = ()) -> list[tuple[str, str]]:
+    """ The query parameters in a fixed order, so that '?a=1&b=2' and '?b=2&a=1' are the same request. """
+    return sorted((key, value) for key, values in query_dict.lists() if key not in exclude for value in values)
+
+
+def cache_key(request) -> str:
+    """
+    The data generation, the path, the query parameters, and the format of the rendered response.
+    The 'format' query parameter is replaced by the format that the content negotiation selected,
+    so that '?format=json' and 'Accept: application/json' share a cache entry.
+    """
+    query = sorted_query(request.query_params, exclude=('format',))
+    key_str = f'{data_generation.current}|{request.path}|{query}|{request.accepted_renderer.format}'
+    return 'api:' + hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+
+def accepts_gzip(request) -> bool:
+    """ Whether the Accept-Encoding header allows gzip, directly or through '*', with a q-value above 0. """
+    qualities = {}
+    for coding_str in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params_str = coding_str.partition(';')
+        quality = 1.0
+        for param_str in params_str.split(';'):
+            name, _, value = param_str.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0.0
+    return False
+
+
+class GenerationVersionedView:
+    """
+    Views whose responses only change with the data generation,
+    these get the HTTP caching headers of middleware.GenerationConditionalMiddleware.
+    Views that send a gzip encoded body when accepts_gzip() set gzip_variants, so that each encoding has its own ETag.
+    """
+    gzip_variants = False
+
+    @classmethod
+    def url_kwargs_exist(cls, url_kwargs: dict) -> bool:
+        """ Whether the table that the URL names exists, a conditional request for one that does not is a 404. """
+        return True
+
+
+class GenerationCachedMixin(GenerationVersionedView):
+    """
+    Serve list() and retrieve() from the response cache, successful responses are cached after rendering.
+    Authentication and throttling still apply, they run before the handler. The browsable API is not cached,
+    its pages show the user that is logged in and carry their CSRF token.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    @staticmethod
+    def cached(handler, request, *args, **kwargs):
+        if isinstance(request.accepted_renderer, BrowsableAPIRenderer):
+            return handler(request, *args, **kwargs)
+        key = cache_key(request)
+        cached = api_cache.get(key)
+        if cached is not None:
+            return cached.to_response()
+        response = handler(request, *args, **kwargs)
+        # streamed responses are never held in memory, so they are not cached
+        if response.status_code == 200 and not response.streaming:
+            response.add_post_render_callback(
+                lambda rendered: api_cache.set(key, CachedResponse(content=rendered.content,
+                                                                   content_type=rendered['Content-Type'],
+                                                                   status_code=rendered.status_code,
+                                                                   vary=rendered.get('Vary'))))
+        return response
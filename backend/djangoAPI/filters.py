@@ -0,0 +1,53 @@
+"""
+Server-side filtering of the curated stellar parameters.
+
+The filterable columns come from the available_params_and_units metadata, so new parameters are filterable
+as soon as the pipeline adds them. Query parameters are '<column>' or '<column>__<lookup>', for example:
+    /api/curated/?teff_value__gte=4000&dist_value__lt=200&has_spectra=1
+The numeric columns are indexed by LoadSQL.create_curated_table.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .dynamic_data import available_params_and_units
+
+numeric_lookups = {'exact', 'gt', 'gte', 'lt', 'lte'}
+string_lookups = {'exact', 'in'}
+# column name -> (value type, allowed lookups)
+curated_filter_columns = {'has_spectra': (int, {'exact'})}
+for param_name, unit in available_params_and_units:
+    if unit == 'string':
+        curated_filter_columns[f'{param_name}_value'] = (str, string_lookups)
+    else:
+        curated_filter_columns[f'{param_name}_value'] = (float, numeric_lookups)
+all_lookups = numeric_lookups | string_lookups
+
+
+def parse_filter_value(param: str, value: str, value_type: type, lookup: str):
+    try:
+        if lookup == 'in':
+            return [value_type(item) for item in value.split(',')]
+        return value_type(value)
+    except ValueError:
+        raise ValidationError({param: f'Expected a {value_type.__name__}, got: {value}'})
+
+
+class CuratedParamFilterBackend(BaseFilterBackend):
+    """ Filters from the query parameters that name a curated column, other query parameters are ignored. """
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        for param, value in request.query_params.items():
+            column_name, _, lookup = param.partition('__')
+            lookup = lookup or 'exact'
+            if column_name not in curated_filter_columns.keys():
+                if param.endswith('_value') or (lookup != 'exact' and lookup in all_lookups):
+                    raise ValidationError({param: 'This column can not be used as a filter.'})
+                continue
+            value_type, allowed_lookups = curated_filter_columns[column_name]
+            if lookup not in allowed_lookups:
+                raise ValidationError({param: f"Allowed lookups for {column_name}: " +
+                                              ', '.join(sorted(allowed_lookups))})
+            filters[f'{column_name}__{lookup}'] = parse_filter_value(param, value, value_type, lookup)
+        if filters:
+            queryset = queryset.filter(**filters)
+        return queryset
@@ -0,0 +1,61 @@
+"""
+The data generation, a counter that increases each time the data served by the API changes,
+see science.db.data_status.set_data_generation_mysql(). The API data are immutable within a generation,
+so the generation is used to key the response caches and as the ETag of the read-only endpoints.
+"""
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+from science.db.data_status import generation_query_str
+from .dynamic_data import data_generation_at_start, data_generation_time_at_start
+
+
+class DataGeneration:
+    """
+    The current data generation of this process. This is checked against the database at most once every
+    check_seconds, and the functions in on_change are called with the new generation when it changes.
+    """
+    def __init__(self, generation: int, migrated_at: datetime, check_seconds: float):
+        self.generation = generation
+        self.migrated_at = migrated_at
+        self.check_seconds = check_seconds
+        self.checked_at = time.monotonic()
+        self.on_change: list[Callable[[int], None]] = []
+        self.lock = Lock()
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self.checked_at < self.check_seconds:
+            return
+        with self.lock:
+            if time.monotonic() - self.checked_at < self.check_seconds:
+                # another thread did the check
+                return
+            self.checked_at = time.monotonic()
+            try:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute(generation_query_str)
+                    row = cursor.fetchone()
+            except DatabaseError:
+                return
+            if row is None or row[0] == self.generation:
+                return
+            generation, migrated_at = row
+            if migrated_at.tzinfo is None:
+                migrated_at = migrated_at.replace(tzinfo=timezone.utc)
+            self.generation, self.migrated_at = generation, migrated_at
+        for callback in self.on_change:
+            callback(generation)
+
+    @property
+    def current(self) -> int:
+        self.refresh_if_stale()
+        return self.generation
+
+
+data_generation = DataGeneration(generation=data_generation_at_start, migrated_at=data_generation_time_at_start,
+                                 check_seconds=settings.API_GENERATION_CHECK_SECONDS)
@@ -0,0 +1,52 @@
+"""
+Columnar copies of the isotopologue line tables, held in memory for ranking lines by strength with NumPy.
+
+Only the columns needed to rank the lines are copied, the ranked lines are then read from the database by primary key.
+The copies are read on first use and dropped when the data generation changes.
+"""
+from threading import Lock
+
+import numpy as np
+
+from .generation import data_generation
+from .models import isotopologue_fields
+from .tables import isotopologue_table, read_isotopologue_columns
+
+strength_fields = ('wavelength_um', 'einstein_a', 'upper_level_energy', 'g_statistical_weight_upper_level')
+
+
+def primary_key_name(isotopologue_url_name: str) -> str:
+    _database, _table_name, molecule = isotopologue_table(isotopologue_url_name)
+    return isotopologue_fields[molecule][0][0]
+
+
+def read_line_columns(isotopologue_url_name: str) -> dict[str, np.ndarray]:
+    """ The strength_fields and the primary key ('pk', int64) of an isotopologue's lines, in wavelength order. """
+    pk_name = primary_key_name(isotopologue_url_name)
+    columns = read_isotopologue_columns(isotopologue_url_name, field_names=(pk_name, *strength_fields))
+    columns['pk'] = columns.pop(pk_name).astype(np.int64)
+    return columns
+
+
+class CurrentLineColumns:
+    """ The line columns of the current data generation, keyed by the lower case isotopologue name. """
+    def __init__(self):
+        self.generation = None
+        self.columns_by_isotopologue: dict[str, dict[str, np.ndarray]] = {}
+        self.lock = Lock()
+
+    def get(self, isotopologue_url_name: str) -> dict[str, np.ndarray]:
+        isotopologue_url_name = isotopologue_url_name.lower()
+        generation = data_generation.current
+        with self.lock:
+            if self.generation != generation:
+                self.columns_by_isotopologue = {}
+                self.generation = generation
+            columns = self.columns_by_isotopologue.get(isotopologue_url_name)
+            if columns is None:
+                columns = self.columns_by_isotopologue[isotopologue_url_name] = read_line_columns(
+                    isotopologue_url_name)
+        return columns
+
+
+line_columns = CurrentLineColumns()
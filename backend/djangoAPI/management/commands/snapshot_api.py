@@ -0,0 +1,31 @@
+"""
+Render the static endpoints of the current data generation to files for nginx, see djangoAPI/snapshots.py.
+The container runs this at start-up (Dockerfile), right after core/settings.py has done any pending migration,
+science.db.migrate.do_migration(). The workers render the snapshots again when the data generation changes,
+and this can also be run by hand:
+
+    python manage.py snapshot_api
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoAPI.generation import data_generation
+from djangoAPI.snapshots import snapshot_dir, render_snapshots, brotli
+
+
+class Command(BaseCommand):
+    help = 'Render the static API endpoints of the current data generation to precompressed files for nginx.'
+
+    def handle(self, *args, **options):
+        generation = data_generation.current
+        try:
+            sizes = render_snapshots(generation)
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        if sizes is None:
+            self.stdout.write(f'The snapshots of data generation {generation} are already rendered.')
+            return
+        for path, size in sizes.items():
+            self.stdout.write(f'{size} bytes {path}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(sizes)} endpoints for data generation {generation} to {snapshot_dir}'
+            f'{"" if brotli is not None else " (gzip only, the brotli package is not installed)"}.'))
@@ -0,0 +1,54 @@
+"""
+Prefill the shared tier of the response cache for the current data generation, see djangoAPI/caching.py.
+Run this right after a migration, before the workers start taking requests:
+
+    python manage.py warm_api_cache
+    python manage.py warm_api_cache --spectra
+"""
+from django.core.management.base import BaseCommand
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+
+from djangoAPI.caching import api_cache
+from djangoAPI.generation import data_generation
+from djangoAPI.tables import spectrum_handles_by_url_name
+
+# the metadata endpoints requested by every page load of the FrontEnd
+hot_paths = [
+    '/api/spectra/',
+    '/api/curated/',
+    '/api/objectnamealiases/',
+    '/api/stats_total/',
+    '/api/stats_instrument/',
+    '/api/available_isotopologues/',
+    '/api/available_params_and_units/',
+    '/api/default_spectrum/',
+    '/api/default_spectrum_info/',
+]
+
+
+class Command(BaseCommand):
+    help = 'Prefill the API response cache for the current data generation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spectra', action='store_true',
+                            help='Also warm the endpoint of every spectrum, this can take a while.')
+
+    def handle(self, *args, **options):
+        if not api_cache.use_shared:
+            self.stdout.write('API_SHARED_CACHE is none, only the cache of this process would be warmed, skipping.')
+            return
+        paths = list(hot_paths)
+        if options['spectra']:
+            paths.extend(f'/api/{spectrum_url_name}/' for spectrum_url_name in sorted(spectrum_handles_by_url_name))
+        factory = APIRequestFactory()
+        for path in paths:
+            match = resolve(path)
+            # call the view without throttling, the warm-up requests all come from this process
+            view = match.func.cls.as_view(match.func.actions, throttle_classes=[])
+            response = view(factory.get(path, SERVER_NAME='localhost'), *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            self.stdout.write(f'{response.status_code} {path}')
+        self.stdout.write(self.style.SUCCESS(f'Warmed {len(paths)} endpoints for data generation '
+                                             f'{data_generation.current}.'))
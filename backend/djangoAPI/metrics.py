@@ -0,0 +1,205 @@
+"""
+Request metrics for the API, exposed in the Prometheus text format at /api/metrics/.
+
+RequestMetricsMiddleware records, per route (the URL name, for example 'stats_total-list' or 'spectrum-list'):
+    spexodisks_api_request_seconds        a histogram of the latency
+    spexodisks_api_response_bytes         the total and count of the response sizes (file downloads are skipped)
+    spexodisks_api_db_queries_total       the number of database queries made in the view
+    spexodisks_api_db_seconds_total       the time spent in those queries
+and per spectrum handle or isotopologue table, for finding the tables that drive the load:
+    spexodisks_api_table_requests_total, spexodisks_api_table_seconds_total, spexodisks_api_table_bytes_total
+The response cache counters (caching.api_cache) are read at scrape time.
+A streamed response runs its queries while it is sent, so it is recorded when the stream ends, with the time,
+bytes and queries of the whole stream.
+
+The metrics are kept in the memory of each process since it started, the Dockerfile runs a single gunicorn worker.
+The scraper authenticates with API_METRICS_TOKEN (core/settings.py), without it the metrics are not served.
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import partial
+from typing import Callable, Iterator
+from threading import Lock
+
+from django.db import connections
+from django.http import FileResponse
+
+from .caching import api_cache
+from .tables import spectrum_handles_by_url_name, isotopologues_by_url_name
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_str(labels: dict) -> str:
+    return '{' + ','.join(f'{name}="{label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+class RouteStats:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(latency_buckets) + 1)
+        self.seconds = 0.0
+        self.requests = 0
+        self.response_bytes = 0
+        self.sized_responses = 0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+class TableStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.response_bytes = 0
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.routes: dict[tuple[str, str, str], RouteStats] = defaultdict(RouteStats)
+        self.tables: dict[tuple[str, str], TableStats] = defaultdict(TableStats)
+        self.lock = Lock()
+
+    def record(self, route: str, method: str, status_code: int, seconds: float, response_bytes: int | None,
+               db_queries: int, db_seconds: float, table: tuple[str, str] | None):
+        with self.lock:
+            route_stats = self.routes[(route, method, f'{status_code // 100}xx')]
+            route_stats.bucket_counts[bisect_left(latency_buckets, seconds)] += 1
+            route_stats.seconds += seconds
+            route_stats.requests += 1
+            if response_bytes is not None:
+                route_stats.response_bytes += response_bytes
+                route_stats.sized_responses += 1
+            route_stats.db_queries += db_queries
+            route_stats.db_seconds += db_seconds
+            if table is not None:
+                table_stats = self.tables[table]
+                table_stats.requests += 1
+                table_stats.seconds += seconds
+                table_stats.response_bytes += response_bytes or 0
+
+    def exposition(self) -> str:
+        """ The metrics in the Prometheus text format. """
+        with self.lock:
+            routes = {key: vars(route_stats).copy() for key, route_stats in self.routes.items()}
+            tables = {key: vars(table_stats).copy() for key, table_stats in self.tables.items()}
+        lines = ['# HELP spexodisks_api_request_seconds Latency of the API requests.',
+                 '# TYPE spexodisks_api_request_seconds histogram']
+        for (route, method, status_class), stats in routes.items():
+            labels = {'route': route, 'method': method, 'status': status_class}
+            cumulative_count = 0
+            for upper_bound, count in zip((*latency_buckets, '+Inf'), stats['bucket_counts']):
+                cumulative_count += count
+                lines.append(f'spexodisks_api_request_seconds_bucket{label_str({**labels, "le": upper_bound})} '
+                             f'{cumulative_count}')
+            lines.append(f'spexodisks_api_request_seconds_sum{label_str(labels)} {stats["seconds"]}')
+            lines.append(f'spexodisks_api_request_seconds_count{label_str(labels)} {stats["requests"]}')
+        for metric_name, metric_type, help_str, value_names in [
+                ('spexodisks_api_response_bytes', 'summary', 'Size of the API responses.',
+                 (('_sum', 'response_bytes'), ('_count', 'sized_responses'))),
+                ('spexodisks_api_db_queries_total', 'counter', 'Database queries made by the API views.',
+                 (('', 'db_queries'),)),
+                ('spexodisks_api_db_seconds_total', 'counter', 'Time in database queries made by the API views.',
+                 (('', 'db_seconds'),))]:
+            lines.extend([f'# HELP {metric_name} {help_str}', f'# TYPE {metric_name} {metric_type}'])
+            for (route, method, status_class), stats in routes.items():
+                labels = label_str({'route': route, 'method': method, 'status': status_class})
+                lines.extend(f'{metric_name}{suffix}{labels} {stats[value_name]}' for suffix, value_name in value_names)
+        for metric_name, help_str, value_name in [
+                ('spexodisks_api_table_requests_total', 'Requests for each spectrum or isotopologue table.',
+                 'requests'),
+                ('spexodisks_api_table_seconds_total', 'Latency of the requests for each table.', 'seconds'),
+                ('spexodisks_api_table_bytes_total', 'Bytes sent for each table.', 'response_bytes')]:
+            lines.extend([f'# HELP {metric_name} {help_str}', f'# TYPE {metric_name} counter'])
+            lines.extend(f'{metric_name}{label_str({"kind": kind, "table": table})} {stats[value_name]}'
+                         for (kind, table), stats in tables.items())
+        for metric_name, help_str, value in [
+                ('spexodisks_api_cache_local_hits_total', 'Hits in the in-process response cache.',
+                 api_cache.local.hits),
+                ('spexodisks_api_cache_local_misses_total', 'Misses in the in-process response cache.',
+                 api_cache.local.misses),
+                ('spexodisks_api_cache_shared_hits_total', 'Hits in the shared response cache.', api_cache.shared_hits),
+                ('spexodisks_api_cache_shared_misses_total', 'Misses in the shared response cache.',
+                 api_cache.shared_misses)]:
+            lines.extend([f'# HELP {metric_name} {help_str}', f'# TYPE {metric_name} counter', f'{metric_name} {value}'])
+        lines.extend(['# HELP spexodisks_api_cache_local_bytes Size of the in-process response cache.',
+                      '# TYPE spexodisks_api_cache_local_bytes gauge',
+                      f'spexodisks_api_cache_local_bytes {api_cache.local.total_bytes}'])
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class QueryTimer:
+    """ A database execute_wrapper that counts the queries and their time. """
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+def request_table(resolver_match) -> tuple[str, str] | None:
+    """ The known spectrum or isotopologue table of a request, unknown names are not recorded. """
+    if resolver_match is None:
+        return None
+    spectrum_url_name = resolver_match.kwargs.get('spectrum_handle', '').lower()
+    if spectrum_url_name in spectrum_handles_by_url_name:
+        return 'spectrum', spectrum_url_name
+    isotopologue_url_name = resolver_match.kwargs.get('isotopologue', '').lower()
+    if isotopologue_url_name in isotopologues_by_url_name:
+        return 'isotopologue', isotopologue_url_name
+    return None
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_timer = QueryTimer()
+        start = time.perf_counter()
+        with self.timed_queries(query_timer):
+            response = self.get_response(request)
+        resolver_match = getattr(request, 'resolver_match', None)
+        record = partial(request_metrics.record,
+                         route=resolver_match.view_name if resolver_match is not None else 'unmatched',
+                         method=request.method, status_code=response.status_code, table=request_table(resolver_match))
+        if response.streaming and not isinstance(response, FileResponse) and not response.is_async:
+            response.streaming_content = self.measured_stream(response.streaming_content, query_timer, start, record)
+            return response
+        record(seconds=time.perf_counter() - start,
+               response_bytes=None if response.streaming else len(response.content),
+               db_queries=query_timer.queries, db_seconds=query_timer.seconds)
+        return response
+
+    @staticmethod
+    def timed_queries(query_timer: QueryTimer) -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(query_timer))
+        return stack
+
+    def measured_stream(self, chunks: Iterator[bytes], query_timer: QueryTimer, start: float,
+                        record: Callable) -> Iterator[bytes]:
+        # the server consumes the stream in the thread of the request, after this middleware has returned
+        response_bytes = 0
+        try:
+            with self.timed_queries(query_timer):
+                for chunk in chunks:
+                    response_bytes += len(chunk)
+                    yield chunk
+        finally:
+            record(seconds=time.perf_counter() - start, response_bytes=response_bytes,
+                   db_queries=query_timer.queries, db_seconds=query_timer.seconds)
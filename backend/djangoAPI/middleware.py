@@ -0,0 +1,65 @@
+"""
+HTTP caching for the read-only endpoints, the views that are a caching.GenerationVersionedView.
+
+The responses only change with the data generation, so the ETag is derived from the generation and the request,
+and Last-Modified is the time that the generation was migrated. A matching If-None-Match (or If-Modified-Since)
+is answered with 304 Not Modified before the view runs, without any query for the data.
+Cache-Control allows the browsers and the nginx proxy cache (nginx/deploy.conf) to reuse the responses,
+nginx revalidates expired responses with a conditional request, which is a cheap 304 from here.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, quote_etag
+
+from .caching import GenerationVersionedView, accepts_gzip, sorted_query
+from .generation import data_generation
+from .snapshots import render_in_background
+
+# nginx serves the static endpoints from the snapshots of a generation, switch them when the generation changes
+data_generation.on_change.append(render_in_background)
+
+
+def generation_etag(request, generation: int, is_gzip: bool = False) -> str:
+    # the representation depends on the query parameters (including 'format') and the Accept header,
+    # and for the views with gzip_variants on the content encoding
+    etag_str = f"{generation}|{request.path}|{sorted_query(request.GET)}|{request.META.get('HTTP_ACCEPT', '')}"
+    etag = hashlib.sha256(etag_str.encode('utf-8')).hexdigest()[:32]
+    return quote_etag(f'{etag}-gz' if is_gzip else etag)
+
+
+def is_generation_cached_view(view_func) -> bool:
+    view_class = getattr(view_func, 'cls', None)
+    return view_class is not None and issubclass(view_class, GenerationVersionedView)
+
+
+class GenerationConditionalMiddleware(MiddlewareMixin):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not is_generation_cached_view(view_func):
+            return None
+        if not view_func.cls.url_kwargs_exist(view_kwargs):
+            # the view answers with its 404
+            return None
+        is_gzip = view_func.cls.gzip_variants and accepts_gzip(request)
+        request.generation_vary = ('Accept', 'Accept-Encoding') if view_func.cls.gzip_variants else ('Accept',)
+        request.generation_etag = generation_etag(request, generation=data_generation.current, is_gzip=is_gzip)
+        request.generation_last_modified = data_generation.migrated_at.timestamp()
+        return self.add_headers(request, get_conditional_response(
+            request, etag=request.generation_etag, last_modified=request.generation_last_modified))
+
+    def process_response(self, request, response):
+        if hasattr(request, 'generation_etag') and response.status_code == 200:
+            self.add_headers(request, response)
+        return response
+
+    @staticmethod
+    def add_headers(request, response):
+        if response is None:
+            return None
+        response['ETag'] = request.generation_etag
+        response['Last-Modified'] = http_date(request.generation_last_modified)
+        patch_cache_control(response, public=True, max_age=settings.API_HTTP_MAX_AGE)
+        patch_vary_headers(response, request.generation_vary)
+        return response
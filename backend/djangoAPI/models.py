@@ -6,7 +6,7 @@ from django.core.mail import send_mail
 from rest_framework import serializers
 from django.contrib.auth.models import User
 
-from .dynamic_data import available_spectra_handles, available_isotopologues, available_params_and_units
+from .dynamic_data import available_isotopologues, available_params_and_units
 
 """
 User authentication
@@ -180,59 +180,11 @@ oh_field_and_data = [
     ]
 
 
-# Dynamically create the isotopologue models
-isotopologue_models = {}
-for molecule in sorted(available_isotopologues.keys()):
-    # Each molecule has different required fields
-    if molecule == 'co':
-        field_and_data = co_field_and_data
-    elif molecule == 'h2o':
-        field_and_data = h2o_field_and_data
-    elif molecule == 'oh':
-        field_and_data = oh_field_and_data
-    else:
+# the fields of the isotopologue tables for each molecule, the tables are read at request time, see tables.py
+isotopologue_fields = {'co': co_field_and_data, 'h2o': h2o_field_and_data, 'oh': oh_field_and_data}
+for molecule in available_isotopologues.keys():
+    if molecule not in isotopologue_fields.keys():
         raise KeyError(f'molecule type: {molecule} not recognized')
-    # initialize the molecule dictionary
-    if molecule not in isotopologue_models.keys():
-        isotopologue_models[molecule] = {}
-    # loop over the isotopologues for this molecule
-    for isotopologue in sorted(available_isotopologues[molecule]):
-        model_name = f'Isotopologue{isotopologue}'
-        table_name = f'isotopologue_{isotopologue}'
-
-
-        class Meta:
-            managed = False
-            db_table = table_name
-            app_label = f'app_label_{model_name}'
-
-
-        # Now construct the model class
-        class_vars = {field_name: field_model for field_name, field_model in field_and_data}
-        iso_model = type(model_name, (models.Model,), dict(Meta=Meta, __module__='models', **class_vars))
-        # save the model to dictionary with the same shape as available_isotopologues
-        isotopologue_models[molecule][isotopologue] = iso_model
-
-# Dynamically create the spectra models
-spectra_fields_and_data = [('wavelength_um', models.FloatField(primary_key=True)),
-                           ('flux', models.FloatField(blank=True, null=True)),
-                           ('flux_error', models.FloatField(blank=True, null=True))]
-
-spectra_models = {}
-for spectrum_handle in sorted(available_spectra_handles):
-    model_name = f'Spectrum{spectrum_handle.lower()}'
-
-
-    class Meta:
-        managed = False
-        db_table = spectrum_handle
-        app_label = f'app_label_{model_name}'
-
-
-    # Now construct the model class
-    class_vars = {field_name: field_model for field_name, field_model in spectra_fields_and_data}
-    spectrum_model = type(model_name, (models.Model,), dict(Meta=Meta, __module__='models', **class_vars))
-    spectra_models[spectrum_handle] = spectrum_model
 
 
 # Dynamically create curated parameters models
@@ -378,6 +330,17 @@ class LineFluxesCo(models.Model):
         db_table = 'line_fluxes_co'
 
 
+class SkyIndex(models.Model):
+    spexodisks_handle = models.CharField(primary_key=True, max_length=50)
+    ra_deg = models.FloatField()
+    dec_deg = models.FloatField()
+    bucket_id = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'sky_index'
+
+
 class ObjectNameAliases(models.Model):
     alias = models.CharField(primary_key=True, max_length=50)
     spexodisks_handle = models.CharField(max_length=50)
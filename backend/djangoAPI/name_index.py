@@ -0,0 +1,95 @@
+"""
+In-memory index of the object names (SIMBAD aliases, popular names and spexodisks handles) for name resolution
+and autocomplete. The index is a sorted array of normalized names, a prefix query is a binary search followed by
+a short scan. It is built on the first query of each data generation.
+"""
+import re
+from bisect import bisect_left
+from threading import Lock
+
+from ref.star_names import star_name_format, StringStarName
+
+from .dynamic_data import schema_prefix
+from .generation import data_generation
+from .models import Curated, ObjectNameAliases
+from .replicas import replica_set
+
+whitespace = re.compile(r'\s+')
+
+
+def compact_name(name: str) -> str:
+    # case and spacing are not significant, 'HD 141569' and 'hd141569' are the same name
+    return whitespace.sub('', str(name)).lower()
+
+
+def formatted_name(name: str) -> str:
+    """ The name in the SIMBAD format used by object_name_aliases, if it can be parsed by star_name_format. """
+    try:
+        return StringStarName(star_name_format(name)).string_name
+    except (ValueError, NameError, KeyError, IndexError, TypeError):
+        return name
+
+
+class NameIndex:
+    def __init__(self, names: list[tuple[str, str]], pop_names: dict[str, str]):
+        """
+        names: (name, spexodisks_handle) pairs
+        pop_names: the popular name of each spexodisks_handle
+        """
+        entries = sorted({(compact_name(name), name, spexodisks_handle) for name, spexodisks_handle in names})
+        self.keys = [key for key, _name, _spexodisks_handle in entries]
+        self.names = [name for _key, name, _spexodisks_handle in entries]
+        self.handles = [spexodisks_handle for _key, _name, spexodisks_handle in entries]
+        self.pop_names = pop_names
+
+    def match(self, index: int) -> dict:
+        return {'spexodisks_handle': self.handles[index], 'pop_name': self.pop_names.get(self.handles[index]),
+                'matched_name': self.names[index]}
+
+    def exact(self, name: str) -> list[dict]:
+        matches = {}
+        for key in dict.fromkeys((compact_name(formatted_name(name)), compact_name(name))):
+            index = bisect_left(self.keys, key)
+            while index < len(self.keys) and self.keys[index] == key:
+                matches.setdefault(self.handles[index], self.match(index))
+                index += 1
+        return list(matches.values())
+
+    def prefix(self, name_start: str, limit: int) -> list[dict]:
+        """ Up to limit objects with a name that starts with name_start, one entry per object. """
+        key = compact_name(name_start)
+        matches = {}
+        index = bisect_left(self.keys, key)
+        while index < len(self.keys) and self.keys[index].startswith(key) and len(matches) < limit:
+            matches.setdefault(self.handles[index], self.match(index))
+            index += 1
+        return list(matches.values())
+
+
+def read_name_index() -> NameIndex:
+    database = replica_set.read_alias(f'{schema_prefix}spexodisks')
+    pop_names = dict(Curated.objects.using(database).values_list('spexodisks_handle', 'pop_name'))
+    names = list(ObjectNameAliases.objects.using(database).values_list('alias', 'spexodisks_handle'))
+    names.extend((pop_name, spexodisks_handle) for spexodisks_handle, pop_name in pop_names.items() if pop_name)
+    names.extend((spexodisks_handle, spexodisks_handle) for spexodisks_handle in pop_names.keys())
+    return NameIndex(names=names, pop_names=pop_names)
+
+
+class CurrentNameIndex:
+    """ The NameIndex of the current data generation. """
+    def __init__(self):
+        self.generation = None
+        self.index = None
+        self.lock = Lock()
+
+    def get(self) -> NameIndex:
+        generation = data_generation.current
+        if self.generation != generation:
+            with self.lock:
+                if self.generation != generation:
+                    self.index = read_name_index()
+                    self.generation = generation
+        return self.index
+
+
+name_index = CurrentNameIndex()
@@ -0,0 +1,15 @@
+"""
+Pagination for the large metadata endpoints.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class CuratedCursorPagination(CursorPagination):
+    """
+    Keyset pagination ordered by spexodisks_handle, requested with '?page_size=', the response then has
+    'next' and 'previous' links with an opaque cursor. Without page_size the full list is returned, as before.
+    """
+    ordering = 'spexodisks_handle'
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,111 @@
+"""
+Opt-in cProfile profiles of individual API requests, for finding where the time goes in a slow request.
+
+A request is profiled when:
+    a staff user sends the header 'X-Profile: 1' (with the usual 'Authorization: Bearer <JWT>'), or
+    it is in the random API_PROFILE_SAMPLE_RATE fraction of all requests (0.0, none, by default).
+
+Each profile is saved in the pstats format to API_PROFILE_DIR, named by the time, the route (the URL name),
+and the duration of the request. Only the newest API_PROFILE_MAX_FILES profiles are kept.
+Staff users can list the profiles at /api/profiles/ and download one at /api/profiles/<name>/, then read it with
+    python -c "import pstats; pstats.Stats('<name>').sort_stats('cumulative').print_stats(30)"
+or a viewer such as snakeviz.
+"""
+import cProfile
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+profile_header = 'HTTP_X_PROFILE'
+profile_name_pattern = re.compile(r'^(?P<time_ns>\d+)_(?P<route>[\w.-]+)_(?P<milliseconds>\d+)ms\.prof$')
+
+
+class ProfileStore:
+    """ A directory of at most max_files profiles, the oldest are deleted first. """
+    def __init__(self, profile_dir: str, max_files: int):
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+
+    def names(self) -> list[str]:
+        """ The names of the stored profiles, newest first. """
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted((name for name in os.listdir(self.profile_dir) if profile_name_pattern.match(name)),
+                      key=lambda name: int(profile_name_pattern.match(name).group('time_ns')), reverse=True)
+
+    def path(self, name: str) -> str | None:
+        """ The path of a stored profile, None for unknown or invalid names. """
+        if not profile_name_pattern.match(name):
+            return None
+        path = os.path.join(self.profile_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def save(self, profiler: cProfile.Profile, route: str, seconds: float) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        route_name = re.sub(r'[^\w.-]', '_', route)
+        name = f'{time.time_ns()}_{route_name}_{round(seconds * 1000)}ms.prof'
+        profiler.dump_stats(os.path.join(self.profile_dir, name))
+        for old_name in self.names()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.profile_dir, old_name))
+            except FileNotFoundError:
+                pass
+        return name
+
+    def describe(self, name: str) -> dict:
+        match = profile_name_pattern.match(name)
+        return {'name': name, 'route': match.group('route'),
+                'created': datetime.fromtimestamp(int(match.group('time_ns')) / 1e9, tz=timezone.utc).isoformat(),
+                'milliseconds': int(match.group('milliseconds')),
+                'bytes': os.path.getsize(os.path.join(self.profile_dir, name))}
+
+
+profile_store = ProfileStore(profile_dir=settings.API_PROFILE_DIR, max_files=settings.API_PROFILE_MAX_FILES)
+
+
+def is_staff_request(request) -> bool:
+    # the API authenticates with JWTs in the views, so this middleware checks the token itself
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def should_profile(request) -> bool:
+    if request.META.get(profile_header) == '1':
+        return is_staff_request(request)
+    sample_rate = settings.API_PROFILE_SAMPLE_RATE
+    return sample_rate > 0.0 and random.random() < sample_rate
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - start
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.view_name if resolver_match is not None else 'unmatched'
+        name = profile_store.save(profiler, route=route, seconds=seconds)
+        response['X-Profile-Name'] = name
+        return response
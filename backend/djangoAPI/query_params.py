@@ -0,0 +1,94 @@
+"""
+Parsing and validation of the optional query parameters used by the API views.
+Invalid values raise a ValidationError, which the REST framework returns as a 400 response.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+def float_query_param(request, param_name: str) -> float | None:
+    value = request.query_params.get(param_name)
+    if value in {None, ''}:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({param_name: f'Expected a number, got: {value}'})
+
+
+def positive_int_query_param(request, param_name: str) -> int | None:
+    value = request.query_params.get(param_name)
+    if value in {None, ''}:
+        return None
+    try:
+        int_value = int(value)
+    except ValueError:
+        raise ValidationError({param_name: f'Expected a positive integer, got: {value}'})
+    if int_value < 1:
+        raise ValidationError({param_name: f'Expected a positive integer, got: {value}'})
+    return int_value
+
+
+def fields_query_param(request, allowed_fields) -> list[str] | None:
+    """ The comma separated 'fields' query parameter, in the order requested. """
+    value = request.query_params.get('fields')
+    if value in {None, ''}:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown_fields = [field for field in fields if field not in allowed_fields]
+    if unknown_fields:
+        raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown_fields)}'})
+    return fields
+
+
+def wavelength_window_bounds(request) -> tuple[float | None, float | None]:
+    return float_query_param(request, 'min_um'), float_query_param(request, 'max_um')
+
+
+def wavelength_window(queryset, request):
+    """ Limit a queryset with the optional 'min_um' and 'max_um' query parameters. """
+    min_um, max_um = wavelength_window_bounds(request)
+    if min_um is not None and max_um is not None:
+        return queryset.filter(wavelength_um__range=(min_um, max_um))
+    elif min_um is not None:
+        return queryset.filter(wavelength_um__gte=min_um)
+    elif max_um is not None:
+        return queryset.filter(wavelength_um__lte=max_um)
+    return queryset
+
+
+def wavelength_window_sql(request) -> tuple[str, list[float]]:
+    """ The SQL WHERE clause and parameters for the optional 'min_um' and 'max_um' query parameters. """
+    min_um, max_um = wavelength_window_bounds(request)
+    if min_um is not None and max_um is not None:
+        return ' WHERE wavelength_um BETWEEN %s AND %s', [min_um, max_um]
+    elif min_um is not None:
+        return ' WHERE wavelength_um >= %s', [min_um]
+    elif max_um is not None:
+        return ' WHERE wavelength_um <= %s', [max_um]
+    return '', []
+
+
+orient_choices = ('records', 'columns')
+
+
+def orient_query_param(request) -> str:
+    """ The optional 'orient' query parameter, 'records' (the default) for a list of rows, or 'columns'. """
+    value = request.query_params.get('orient')
+    if value in {None, ''}:
+        return 'records'
+    if value not in orient_choices:
+        raise ValidationError({'orient': f'Expected one of {", ".join(orient_choices)}, got: {value}'})
+    return value
+
+
+stream_choices = ('jsonl', 'array')
+
+
+def stream_query_param(request) -> str | None:
+    """ The optional 'stream' query parameter, 'jsonl' or 'array', see streaming.py. """
+    value = request.query_params.get('stream')
+    if value in {None, ''}:
+        return None
+    if value not in stream_choices:
+        raise ValidationError({'stream': f'Expected one of {", ".join(stream_choices)}, got: {value}'})
+    return value
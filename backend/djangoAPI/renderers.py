@@ -0,0 +1,196 @@
+"""
+Binary renderers for the spectrum endpoints.
+
+The 'bin' format is a columnar frame that a browser can map straight into typed arrays:
+
+    bytes [0, 4)      magic, b'SPXC'
+    bytes [4, 8)      uint32 little-endian, length of the JSON header in bytes (H)
+    bytes [8, 8 + H)  UTF-8 JSON header, space padded so that the body starts on an 8-byte boundary
+    bytes [8 + H, )   the body, one contiguous little-endian buffer per column, each starting on an 8-byte boundary
+
+The header lists the columns in order as {"name", "dtype", "offset", "length"}, where 'offset' is in bytes from the
+start of the body and 'length' is the number of elements. For example, in JavaScript:
+    new Float64Array(buffer, 8 + H + column.offset, column.length)
+
+The multi-spectrum (batch) endpoint uses the same frame, with a header entry per spectrum, see pack_spectra().
+
+The 'npy' format is a standard NumPy .npy file of a structured array, readable with numpy.load().
+
+FastJSONRenderer is the default JSON renderer of the API (REST_FRAMEWORK in core/settings.py), it encodes with orjson.
+"""
+import json
+from io import BytesIO
+
+import numpy as np
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+binary_magic = b'SPXC'
+binary_version = 1
+byte_alignment = 8
+spectrum_dtypes = (('wavelength_um', '<f8'), ('flux', '<f4'), ('flux_error', '<f4'))
+
+
+def spectrum_arrays(rows) -> dict[str, np.ndarray]:
+    """
+    Convert the (wavelength_um, flux, flux_error) rows of a spectrum to little-endian column arrays.
+    NULL values, such as the gap markers between spectral segments, become NaN.
+    """
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(spectrum_dtypes))
+    return {column_name: np.ascontiguousarray(data[:, column_index], dtype=dtype)
+            for column_index, (column_name, dtype) in enumerate(spectrum_dtypes)}
+
+
+def json_floats(data_array: np.ndarray) -> np.ndarray:
+    """
+    float32 values as the float64 of their shortest repr, 1.23 rather than 1.2300000190734863,
+    which is what MySQL returns for a FLOAT column.
+    """
+    if data_array.dtype == np.float32:
+        return data_array.astype(str).astype(np.float64)
+    return data_array
+
+
+def arrays_to_lists(columns: dict[str, np.ndarray]) -> dict[str, list]:
+    """ The JSON version of the column arrays, NaN becomes None (null). """
+    return {column_name: np.where(np.isnan(data_array), None, json_floats(data_array)).tolist()
+            for column_name, data_array in columns.items()}
+
+
+def is_array_data(data) -> bool:
+    return isinstance(data, dict) and bool(data) and all(isinstance(value, np.ndarray) for value in data.values())
+
+
+def is_batch_array_data(data) -> bool:
+    return isinstance(data, dict) and bool(data) and all(is_array_data(value) for value in data.values())
+
+
+def pad_length(length: int) -> int:
+    return (byte_alignment - length % byte_alignment) % byte_alignment
+
+
+def column_layout(columns: dict[str, np.ndarray], body_offset: int = 0) -> tuple[list[dict], int]:
+    """
+    Lay out the columns back to back with 8-byte alignment, starting at body_offset.
+    Returns the per-column header entries and the offset after the last column.
+    """
+    layout = []
+    offset = body_offset
+    for column_name, data_array in columns.items():
+        layout.append({'name': column_name, 'dtype': data_array.dtype.str,
+                       'offset': offset, 'length': int(data_array.size)})
+        offset += data_array.nbytes
+        offset += pad_length(offset)
+    return layout, offset
+
+
+def pack_frame(header: dict, arrays: list[np.ndarray]) -> bytes:
+    """
+    Write the magic, the JSON header, and the arrays (in header order) as a single binary frame.
+    """
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * pad_length(len(binary_magic) + 4 + len(header_bytes))
+    frame = [binary_magic, np.uint32(len(header_bytes)).astype('<u4').tobytes(), header_bytes]
+    for data_array in arrays:
+        frame.append(data_array.astype(data_array.dtype.newbyteorder('<'), copy=False).tobytes())
+        frame.append(b'\x00' * pad_length(data_array.nbytes))
+    return b''.join(frame)
+
+
+def pack_columns(columns: dict[str, np.ndarray], **header_extras) -> bytes:
+    layout, _end_offset = column_layout(columns)
+    header = {'version': binary_version, 'rows': len(next(iter(columns.values()))), 'columns': layout,
+              **header_extras}
+    return pack_frame(header=header, arrays=list(columns.values()))
+
+
+def pack_spectra(spectra: dict[str, dict[str, np.ndarray]]) -> bytes:
+    """
+    Several spectra in one frame, the header has one entry per spectrum, {"spectrum_handle", "rows", "columns"},
+    and the column offsets are from the start of the shared body.
+    """
+    header = {'version': binary_version, 'spectra': []}
+    arrays = []
+    body_offset = 0
+    for spectrum_handle, columns in spectra.items():
+        layout, body_offset = column_layout(columns, body_offset=body_offset)
+        header['spectra'].append({'spectrum_handle': spectrum_handle,
+                                  'rows': len(next(iter(columns.values()))), 'columns': layout})
+        arrays.extend(columns.values())
+    return pack_frame(header=header, arrays=arrays)
+
+
+def pack_npy(columns: dict[str, np.ndarray]) -> bytes:
+    structured_array = np.empty(len(next(iter(columns.values()))),
+                                dtype=[(column_name, data_array.dtype.str)
+                                       for column_name, data_array in columns.items()])
+    for column_name, data_array in columns.items():
+        structured_array[column_name] = data_array
+    buffer = BytesIO()
+    np.save(buffer, structured_array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+class FastJSONRenderer(BaseRenderer):
+    """
+    The JSON renderer of the REST framework, encoded with orjson, which also encodes NumPy arrays directly.
+    Types that orjson does not know, such as Decimal and lazy translation strings, are encoded as by the REST framework.
+    NaN and infinity become null.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        # the browsable API asks for an indent, orjson only has 2 spaces
+        if (renderer_context or {}).get('indent') or 'indent=' in (accepted_media_type or ''):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=self.default, option=options)
+
+
+def render_error(data, renderer_context) -> bytes:
+    """
+    Errors (bad parameters, not found, throttling) are not arrays, they are sent as JSON with the JSON content type,
+    so that a client does not read them as a binary spectrum.
+    """
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+        response['Content-Type'] = FastJSONRenderer.media_type
+    return FastJSONRenderer().render(data)
+
+
+class SpectrumBinaryRenderer(BaseRenderer):
+    """ Columnar binary frame, see the module docstring for the layout. """
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if is_array_data(data):
+            return pack_columns(data)
+        elif is_batch_array_data(data):
+            return pack_spectra(data)
+        return render_error(data, renderer_context)
+
+
+class SpectrumNpyRenderer(BaseRenderer):
+    """ NumPy .npy file of a structured array with one field per column. """
+    media_type = 'application/x-npy'
+    format = 'npy'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if is_array_data(data):
+            return pack_npy(data)
+        return render_error(data, renderer_context)
+
+
+binary_renderer_classes = [SpectrumBinaryRenderer, SpectrumNpyRenderer]
+binary_formats = {renderer_class.format for renderer_class in binary_renderer_classes}
@@ -0,0 +1,84 @@
+"""
+Reads of the data aliases from the MySQL read replicas (API_REPLICA_HOSTS in core/settings.py), so that the API's
+reads scale out and do not compete with the bulk inserts of the pipeline on the primary.
+
+A replica serves the API once it has the data generation that the API is serving. The pipeline sets the generation
+(science.db.data_status.set_data_generation_mysql) after it has written the data, and replication applies the
+changes in order, so a replica with the generation also has all of that generation's data. The replicas are checked
+at most once every API_GENERATION_CHECK_SECONDS, and again as soon as the data generation changes. Replicas that are
+behind, or that fail the check, are skipped until the next check, and the reads go to the primary when no replica
+is caught up.
+"""
+import time
+from itertools import count
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+from science.db.data_status import generation_query_str
+from .generation import data_generation
+
+
+class ReplicaSet:
+    """ The replicas of the data aliases, each replica is a {alias: replica alias} dictionary. """
+    def __init__(self, replicas: list[dict[str, str]], check_seconds: float):
+        self.replicas = replicas
+        self.check_seconds = check_seconds
+        self.checked_at = None
+        self.caught_up: list[dict[str, str]] = []
+        self.turn = count()
+        self.lock = Lock()
+
+    def replica_generation(self, replica: dict[str, str]) -> int | None:
+        # the generation table is in its own schema, so any of the replica's aliases can read it
+        try:
+            with connections[next(iter(replica.values()))].cursor() as cursor:
+                cursor.execute(generation_query_str)
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None
+        return None if row is None else row[0]
+
+    def refresh_if_stale(self):
+        if self.checked_at is not None and time.monotonic() - self.checked_at < self.check_seconds:
+            return
+        with self.lock:
+            if self.checked_at is not None and time.monotonic() - self.checked_at < self.check_seconds:
+                # another thread did the check
+                return
+            generation = data_generation.current
+            caught_up = []
+            for replica in self.replicas:
+                replica_generation = self.replica_generation(replica)
+                if replica_generation is not None and replica_generation >= generation:
+                    caught_up.append(replica)
+            self.caught_up = caught_up
+            self.checked_at = time.monotonic()
+
+    def expire(self, _generation: int = None):
+        self.checked_at = None
+
+    def read_alias(self, alias: str) -> str:
+        """ The alias to read the data of alias from, the caught up replicas in turn, or alias itself. """
+        if not self.replicas:
+            return alias
+        self.refresh_if_stale()
+        caught_up = self.caught_up
+        if not caught_up or alias not in caught_up[0]:
+            return alias
+        return caught_up[next(self.turn) % len(caught_up)][alias]
+
+
+replica_set = ReplicaSet(replicas=[dict(zip(settings.API_REPLICA_ALIASES.keys(), replica_aliases))
+                                   for replica_aliases in zip(*settings.API_REPLICA_ALIASES.values())],
+                         check_seconds=settings.API_GENERATION_CHECK_SECONDS)
+# a replica that had the previous generation may not have the new one yet
+data_generation.on_change.append(replica_set.expire)
+
+
+class ReplicaReadMixin:
+    """ Read the queryset of a read-only viewset from a caught up replica of its alias. """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.using(replica_set.read_alias(queryset.db))
@@ -4,8 +4,7 @@ from django.core import exceptions
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from .models import (spectra_models, isotopologue_models,
-                     AvailableIsotopologues, AvailableFloatParams, AvailableSpectrumParams, AvailableStrParams, Curated,
+from .models import (AvailableIsotopologues, AvailableFloatParams, AvailableSpectrumParams, AvailableStrParams, Curated,
                      DjangoMigrations, FluxCalibration, LineFluxesCo, ObjectNameAliases, ObjectParamsFloat,
                      ObjectParamsStr, Spectra, StackedLineSpectra, AvailableParamsAndUnits,
                      DefaultSpectrum, DefaultSpectrumInfo, StatsTotal, StatsInstrument)
@@ -84,37 +83,17 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 
 """
-Dynamic ModelSerializers
+Static ModelSerializers
 """
-isotopologue_serializers = {}
-for molecule in sorted(isotopologue_models.keys()):
-    isotopologue_serializers[molecule] = {}
-    for isotopologue in sorted(isotopologue_models[molecule].keys()):
-        class Meta:
-            model = isotopologue_models[molecule][isotopologue]
-            fields = '__all__'
-
-
-        # Now construct the serializer class
-        serializer_name = f'Isotopologue{isotopologue}Serializer'
-        iso_serializer = type(serializer_name, (ModelSerializer,), dict(Meta=Meta, __module__='serializers'))
-        isotopologue_serializers[molecule][isotopologue] = iso_serializer
-
-spectra_serializers = {}
-for spectrum_handle in sorted(spectra_models.keys()):
-    class Meta:
-        model = spectra_models[spectrum_handle]
-        fields = '__all__'
-
 
-    # Now construct the serializer class
-    serializer_name = f'{spectrum_handle.title()}Serializer'
-    spectrum_serializer = type(serializer_name, (ModelSerializer,), dict(Meta=Meta, __module__='serializers'))
-    spectra_serializers[spectrum_handle] = spectrum_serializer
 
-"""
-Static ModelSerializers
-"""
+class FieldsModelSerializer(ModelSerializer):
+    """ A ModelSerializer that can be limited to some of its fields with the 'fields' keyword argument. """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 
 class StatsTotalSerializer(serializers.ModelSerializer):
@@ -171,7 +150,7 @@ class AvailableStrParamsSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class CuratedSerializer(ModelSerializer):
+class CuratedSerializer(FieldsModelSerializer):
     class Meta:
         model = Curated
         fields = '__all__'
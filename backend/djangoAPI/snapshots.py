@@ -0,0 +1,156 @@
+"""
+Pre-rendered snapshots of the static endpoints, the router URLs in urls.py and the bootstrap document.
+
+These are a pure function of the migrated data, so they are rendered once per data generation to precompressed
+files, and nginx (nginx/deploy.conf) serves plain GET requests for them from disk
+without calling Django. Requests with a query string, an Authorization header, or for the browsable API still go
+to Django. The layout is:
+
+    API_SNAPSHOT_DIR/<generation>/api/<endpoint>/index.json     and index.json.gz, and index.json.br if the
+                                                                 optional brotli package is installed
+    API_SNAPSHOT_DIR/current -> <generation>
+
+The migration removes the 'current' link when it starts a new generation (science.db.data_status), and the
+container renders the snapshots at start-up ('python manage.py snapshot_api' in the Dockerfile). A worker that sees
+a new data generation while it runs also removes a link to an older generation, and renders the new generation in
+a background thread, so nginx falls back to Django only while the snapshots are rendered. The processes take turns
+with a lock file, and a generation that is already linked is not rendered again.
+"""
+import fcntl
+import gzip
+import os
+import shutil
+from threading import Thread
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+snapshot_dir = settings.API_SNAPSHOT_DIR
+current_link = os.path.join(snapshot_dir, 'current')
+index_file_name = 'index.json'
+lock_file_name = '.render.lock'
+# the previous generation is kept for requests that are in flight when the link is switched
+keep_generations = 2
+
+
+def generation_dir(generation: int) -> str:
+    return os.path.join(snapshot_dir, str(generation))
+
+
+def endpoint_path(generation: int, url_path: str) -> str:
+    return os.path.join(generation_dir(generation), url_path.strip('/'), index_file_name)
+
+
+def write_snapshot(generation: int, url_path: str, content: bytes) -> list[str]:
+    """ Write the rendered content of the endpoint at url_path ('/api/stats_total/'), and its compressed copies. """
+    path = endpoint_path(generation, url_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = {path: content, f'{path}.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed[f'{path}.br'] = brotli.compress(content, quality=11)
+    for file_path, file_content in compressed.items():
+        with open(file_path, 'wb') as f:
+            f.write(file_content)
+    return list(compressed.keys())
+
+
+def current_snapshot_generation() -> int | None:
+    try:
+        return int(os.readlink(current_link))
+    except (OSError, ValueError):
+        return None
+
+
+def link_current(generation: int):
+    """ Point the 'current' link to a generation, the switch is atomic for nginx. """
+    temp_link = f'{current_link}.{os.getpid()}'
+    # relative, so that the link also resolves where nginx mounts the directory
+    os.symlink(str(generation), temp_link)
+    os.replace(temp_link, current_link)
+
+
+def prune_snapshots():
+    """ Delete all but the newest keep_generations snapshots. """
+    generations = sorted(int(name) for name in os.listdir(snapshot_dir) if name.isdigit())
+    for generation in generations[:-keep_generations]:
+        shutil.rmtree(generation_dir(generation), ignore_errors=True)
+
+
+def retire_stale_snapshot(generation: int):
+    """ Stop nginx from serving the snapshots of an older generation, see the module docstring. """
+    snapshot_generation = current_snapshot_generation()
+    if snapshot_generation is not None and snapshot_generation < generation:
+        try:
+            os.remove(current_link)
+        except FileNotFoundError:
+            # another worker removed it
+            pass
+
+
+def snapshot_paths() -> list[str]:
+    """ The list URL of each viewset registered with the router, and the bootstrap document. """
+    from .urls import router
+    return [*(f'/api/{prefix}/' for prefix, _viewset, _basename in router.registry), '/api/bootstrap/']
+
+
+def render_endpoint(factory: APIRequestFactory, path: str) -> bytes:
+    match = resolve(path)
+    # call the view without throttling, the snapshot requests all come from this process
+    actions = getattr(match.func, 'actions', None)
+    if actions is None:
+        view = match.func.cls.as_view(throttle_classes=[])
+    else:
+        view = match.func.cls.as_view(actions, throttle_classes=[])
+    response = view(factory.get(path, SERVER_NAME='localhost', HTTP_ACCEPT='application/json'),
+                    *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} returned {response.status_code}, the snapshots were not switched.')
+    return response.content
+
+
+def render_snapshots(generation: int) -> dict[str, int] | None:
+    """
+    Render the static endpoints of a generation and point the 'current' link to it, returns the size of each
+    rendered endpoint, or None if the generation (or a newer one) is already linked.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, lock_file_name), 'w') as lock_file:
+        # wait for a render in another process, that may have been this generation
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        snapshot_generation = current_snapshot_generation()
+        if snapshot_generation is not None and snapshot_generation >= generation:
+            return None
+        factory = APIRequestFactory()
+        sizes = {}
+        for path in snapshot_paths():
+            content = render_endpoint(factory, path)
+            write_snapshot(generation, url_path=path, content=content)
+            sizes[path] = len(content)
+        link_current(generation)
+        prune_snapshots()
+    return sizes
+
+
+def render_in_background(generation: int):
+    """ The on_change hook of the data generation, see the module docstring. """
+    retire_stale_snapshot(generation)
+
+    def render():
+        try:
+            render_snapshots(generation)
+        except Exception as error:
+            # nginx keeps asking Django, the next start-up or generation renders the snapshots
+            print(f'The API snapshots of data generation {generation} were not rendered: {error!r}')
+        finally:
+            connections.close_all()
+
+    Thread(target=render, name=f'snapshot-{generation}', daemon=True).start()
@@ -0,0 +1,88 @@
+"""
+Streamed list responses, so that the memory of a worker does not grow with the size of the table.
+
+MySQL client libraries buffer the whole result of a query, including for QuerySet.iterator(), so the rows are read
+in keyset chunks instead: ORDER BY the unique key, LIMIT chunk_size, and the next chunk starts after the last key.
+The key is the field that the viewset's queryset is ordered by, so the order is the same as without streaming.
+Each chunk is a short, indexed query, and only one chunk is held in memory while it is encoded and sent.
+
+The rows are sent with '?stream=jsonl' as JSON lines, one {field: value} object per line, or with '?stream=array'
+as a single JSON array of the same objects.
+"""
+from typing import Iterator
+
+import orjson
+from django.http import StreamingHttpResponse
+
+from .renderers import FastJSONRenderer
+
+stream_chunk_size = 5000
+stream_content_types = {'jsonl': 'application/x-ndjson', 'array': 'application/json'}
+
+
+def keyset_ordering(queryset) -> tuple[str, bool]:
+    """
+    The unique field that the queryset is ordered by, and whether the order is descending, so that a streamed list
+    has the same order as the list. Unordered querysets are streamed in primary key order. Raises ValueError
+    for an ordering that is not a single unique field, the chunks could not start after a key of that ordering.
+    """
+    model_meta = queryset.model._meta
+    ordering = queryset.query.order_by or (model_meta.ordering if queryset.query.default_ordering else ())
+    if not ordering:
+        return model_meta.pk.name, False
+    if len(ordering) != 1 or not isinstance(ordering[0], str) or ordering[0] == '?':
+        raise ValueError(f'streaming needs an ordering by one unique field, got: {", ".join(map(str, ordering))}')
+    field_name = ordering[0].lstrip('-')
+    field = model_meta.pk if field_name == 'pk' else next(
+        (field for field in model_meta.concrete_fields if field.name == field_name), None)
+    if field is None or not (field.primary_key or field.unique):
+        raise ValueError(f'streaming needs an ordering by one unique field, got: {ordering[0]}')
+    return field.name, ordering[0].startswith('-')
+
+
+def queryset_chunks(queryset, field_names: list[str], ordering: tuple[str, bool],
+                    chunk_size: int = stream_chunk_size) -> Iterator[list[tuple]]:
+    """ The values_list() rows of a queryset in chunks, in the order from keyset_ordering(). """
+    key_name, descending = ordering
+    # the key is selected for the next chunk, but only field_names are returned
+    selected_names = field_names if key_name in field_names else [*field_names, key_name]
+    key_index = selected_names.index(key_name)
+    queryset = queryset.order_by(f'-{key_name}' if descending else key_name)
+    key_lookup = f'{key_name}__lt' if descending else f'{key_name}__gt'
+    last_key = None
+    while True:
+        chunk_queryset = queryset if last_key is None else queryset.filter(**{key_lookup: last_key})
+        rows = list(chunk_queryset.values_list(*selected_names)[:chunk_size])
+        if rows:
+            yield rows if selected_names is field_names else [row[:len(field_names)] for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_key = rows[-1][key_index]
+
+
+def encode_rows(field_names: list[str], chunks: Iterator[list[tuple]], stream_format: str) -> Iterator[bytes]:
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+    default = FastJSONRenderer.default
+    separator = b'\n' if stream_format == 'jsonl' else b','
+    if stream_format == 'array':
+        yield b'['
+    is_first = True
+    for rows in chunks:
+        encoded = separator.join(orjson.dumps(dict(zip(field_names, row)), default=default, option=options)
+                                 for row in rows)
+        if stream_format == 'jsonl':
+            yield encoded + separator
+        else:
+            yield encoded if is_first else separator + encoded
+        is_first = False
+    if stream_format == 'array':
+        yield b']'
+
+
+def streaming_rows_response(field_names: list[str], chunks: Iterator[list[tuple]],
+                            stream_format: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(encode_rows(field_names, chunks, stream_format=stream_format),
+                                     content_type=stream_content_types[stream_format])
+    # let nginx pass the chunks on as they come
+    response['X-Accel-Buffering'] = 'no'
+    return response
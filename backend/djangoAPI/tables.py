@@ -0,0 +1,341 @@
+"""
+Request-time access to the per-spectrum and per-isotopologue tables.
+
+There is one table per spectrum handle and one per isotopologue, thousands in total, so these are not Django models.
+The table name in a request is validated against the tables of the manifest (dynamic_data), which is read again
+when the data generation changes, and then read with plain SQL, this keeps the start-up time and memory of each
+worker independent of the size of the catalog.
+The spectra may instead be stored in a single table or as blobs, see science/db/spectrum_store.py,
+the functions here read the layout that is recorded in the manifest. When the pipeline's .npy file of a spectrum
+with the digest in the manifest is found (by dynamic_data.dispatch), the spectrum is sliced from the memory-mapped
+file instead, a staged file is not served until the manifest has its digest.
+"""
+from threading import Thread
+from typing import Iterator
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import NotFound
+
+from science.db.sql_tables import consolidated_spectra_tables
+from science.db.spectrum_store import unpack_spectrum_blob
+from .dynamic_data import available_spectra_to_database, available_isotopologues_to_database, manifest, \
+    dispatch, replace_items, reload_manifest
+from .generation import data_generation
+from .models import isotopologue_fields
+from .query_params import wavelength_window_sql, wavelength_window_bounds
+from .renderers import json_floats
+from .replicas import replica_set
+
+spectrum_fields = ('wavelength_um', 'flux', 'flux_error')
+# URLs use the lower case names
+spectrum_handles_by_url_name = {}
+isotopologues_by_url_name = {}
+
+
+def index_url_names():
+    replace_items(spectrum_handles_by_url_name, {spectrum_handle.lower(): spectrum_handle
+                                                 for spectrum_handle in available_spectra_to_database.keys()})
+    replace_items(isotopologues_by_url_name, {isotopologue.lower(): (molecule, isotopologue)
+                                              for molecule, isotopologues in available_isotopologues_to_database.items()
+                                              for isotopologue in isotopologues.keys()})
+
+
+def reload_tables(_generation: int):
+    # a new data generation may have added or moved tables
+    reload_manifest()
+    index_url_names()
+
+
+index_url_names()
+data_generation.on_change.append(reload_tables)
+
+def refresh_spectrum_files(generation: int):
+    # the pipeline writes the spectrum files with each new data generation, listing the output directory is slow,
+    # so it is indexed in the background, until then the spectra with new digests are read from MySQL
+    Thread(target=dispatch.refresh, name=f'dispatch-{generation}', daemon=True).start()
+
+
+data_generation.on_change.append(refresh_spectrum_files)
+
+
+def quote_name(database: str, name: str) -> str:
+    return connections[database].ops.quote_name(name)
+
+
+def read_cursor(database: str):
+    # a cursor of a read replica of the database when one is caught up, see replicas.py
+    return connections[replica_set.read_alias(database)].cursor()
+
+
+def spectrum_table(spectrum_url_name: str) -> tuple[str, str]:
+    """ The database and table for a spectrum handle, raises NotFound (404) for unknown handles. """
+    try:
+        spectrum_handle = spectrum_handles_by_url_name[spectrum_url_name.lower()]
+    except KeyError:
+        raise NotFound(f'Unknown spectrum handle: {spectrum_url_name}')
+    return available_spectra_to_database[spectrum_handle], spectrum_handle
+
+
+def spectrum_exists(spectrum_url_name: str) -> bool:
+    return spectrum_url_name.lower() in spectrum_handles_by_url_name
+
+
+def isotopologue_exists(isotopologue_url_name: str) -> bool:
+    return isotopologue_url_name.lower() in isotopologues_by_url_name
+
+
+def isotopologue_table(isotopologue_url_name: str) -> tuple[str, str, str]:
+    """ The database, table, and molecule for an isotopologue, raises NotFound (404) for unknown isotopologues. """
+    try:
+        molecule, isotopologue = isotopologues_by_url_name[isotopologue_url_name.lower()]
+    except KeyError:
+        raise NotFound(f'Unknown isotopologue: {isotopologue_url_name}')
+    return available_isotopologues_to_database[molecule][isotopologue], f'isotopologue_{isotopologue}', molecule
+
+
+def spectrum_select_str(database: str, table_name: str) -> str:
+    return f"SELECT {', '.join(spectrum_fields)} FROM {quote_name(database, table_name)}"
+
+
+def spectrum_table_sql(spectrum_handle: str, where_str: str, params: list) -> tuple[str, str, list]:
+    """
+    The table that holds a spectrum, and the WHERE clause and parameters for its rows, with the 'tables' and
+    'single_table' layouts. where_str and params are a condition on the wavelength, as from wavelength_window_sql().
+    """
+    if manifest['spectra_layout'] == 'single_table':
+        return (consolidated_spectra_tables[manifest['spectra_layout']],
+                ' WHERE spectrum_handle = %s' + where_str.replace(' WHERE ', ' AND ', 1), [spectrum_handle, *params])
+    return spectrum_handle, where_str, list(params)
+
+
+def read_spectrum_blobs(database: str, spectrum_handles: list[str]) -> dict[str, dict[str, np.ndarray]]:
+    """ The column arrays of several spectra with the 'blob' layout, with one query. """
+    table_str = quote_name(database, consolidated_spectra_tables['blob'])
+    with read_cursor(database) as cursor:
+        cursor.execute(f"SELECT spectrum_handle, num_points, data FROM {table_str} "
+                       f"WHERE spectrum_handle IN ({', '.join(['%s'] * len(spectrum_handles))})", spectrum_handles)
+        return {spectrum_handle: unpack_spectrum_blob(data, num_points)
+                for spectrum_handle, num_points, data in cursor.fetchall()}
+
+
+def read_spectrum_blob(database: str, spectrum_handle: str) -> dict[str, np.ndarray]:
+    try:
+        return read_spectrum_blobs(database, [spectrum_handle])[spectrum_handle]
+    except KeyError:
+        raise NotFound(f'Unknown spectrum handle: {spectrum_handle}')
+
+
+def read_spectrum_file(spectrum_handle: str) -> dict[str, np.ndarray] | None:
+    """
+    The column arrays of a spectrum's .npy file, memory mapped, so that a slice is read from the page cache
+    without a copy or a database query. None if the spectrum has no file with the digest in the manifest.
+    """
+    if not settings.API_SPECTRUM_FILES:
+        return None
+    file_digest = manifest['spectrum_files'].get(spectrum_handle)
+    if file_digest is None:
+        return None
+    path = dispatch.spectrum_file_by_handle_and_digest.get((spectrum_handle.lower(), file_digest))
+    if path is None:
+        return None
+    try:
+        spectrum = np.load(path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        # removed or unreadable since the files were indexed, the spectrum is read from MySQL
+        return None
+    return {field_name: spectrum[field_name] for field_name in spectrum_fields}
+
+
+def read_spectrum_columns(database: str, spectrum_handle: str) -> dict[str, np.ndarray] | None:
+    """ The column arrays of a spectrum from its file or its blob, None if it is read from a table with SQL. """
+    columns = read_spectrum_file(spectrum_handle)
+    if columns is None and manifest['spectra_layout'] == 'blob':
+        columns = read_spectrum_blob(database, spectrum_handle)
+    return columns
+
+
+def window_slice(columns: dict[str, np.ndarray], request) -> tuple[int, int]:
+    """ The start and stop index of the optional window in the columns of a spectrum. """
+    min_um, max_um = wavelength_window_bounds(request)
+    wavelength_um = columns['wavelength_um']
+    start = 0 if min_um is None else int(np.searchsorted(wavelength_um, min_um, side='left'))
+    stop = len(wavelength_um) if max_um is None else int(np.searchsorted(wavelength_um, max_um, side='right'))
+    return start, max(start, stop)
+
+
+def window_columns(columns: dict[str, np.ndarray], request) -> dict[str, np.ndarray]:
+    """ The columns in the optional window, as views of the columns. """
+    start, stop = window_slice(columns, request)
+    return {field_name: column[start:stop] for field_name, column in columns.items()}
+
+
+def column_rows(columns: dict[str, np.ndarray], start: int, stop: int) -> list[tuple]:
+    # the gaps between the segments of a spectrum are NaN in the arrays and NULL in a table
+    return [tuple(None if value != value else value for value in row)
+            for row in zip(*(json_floats(columns[field_name][start:stop]).tolist() for field_name in spectrum_fields))]
+
+
+def read_spectrum_window_columns(spectrum_url_name: str, request) -> dict[str, np.ndarray] | None:
+    """ The column arrays of a spectrum in the optional window from read_spectrum_columns(), or None. """
+    database, spectrum_handle = spectrum_table(spectrum_url_name)
+    columns = read_spectrum_columns(database, spectrum_handle)
+    if columns is None:
+        return None
+    return window_columns(columns, request)
+
+
+def read_spectrum_rows(spectrum_url_name: str, request) -> list[tuple]:
+    """ The (wavelength_um, flux, flux_error) rows of a spectrum in wavelength order, in the optional window. """
+    database, spectrum_handle = spectrum_table(spectrum_url_name)
+    columns = read_spectrum_columns(database, spectrum_handle)
+    if columns is not None:
+        return column_rows(columns, *window_slice(columns, request))
+    table_name, where_str, params = spectrum_table_sql(spectrum_handle, *wavelength_window_sql(request))
+    with read_cursor(database) as cursor:
+        cursor.execute(f'{spectrum_select_str(database, table_name)}{where_str} ORDER BY wavelength_um', params)
+        return cursor.fetchall()
+
+
+def keyset_chunks(database: str, select_str: str, key_column: str, where_str: str, params: list,
+                  chunk_size: int) -> Iterator[list[tuple]]:
+    """
+    The rows of a query in chunks of chunk_size, in the order of key_column, which must be unique and
+    the first column of select_str, see streaming.py.
+    """
+    key_where_str = f'{where_str} AND {key_column} > %s' if where_str else f' WHERE {key_column} > %s'
+    rows = None
+    while rows is None or len(rows) == chunk_size:
+        with read_cursor(database) as cursor:
+            if rows is None:
+                cursor.execute(f'{select_str}{where_str} ORDER BY {key_column} LIMIT {chunk_size}', params)
+            else:
+                cursor.execute(f'{select_str}{key_where_str} ORDER BY {key_column} LIMIT {chunk_size}',
+                               [*params, rows[-1][0]])
+            rows = cursor.fetchall()
+        if rows:
+            yield rows
+
+
+def spectrum_row_chunks(spectrum_url_name: str, request, chunk_size: int) -> Iterator[list[tuple]]:
+    """ The rows of read_spectrum_rows() in chunks, the handle and the window are checked before the first read. """
+    database, spectrum_handle = spectrum_table(spectrum_url_name)
+    columns = read_spectrum_columns(database, spectrum_handle)
+    if columns is not None:
+        start, stop = window_slice(columns, request)
+        return (column_rows(columns, chunk_start, min(chunk_start + chunk_size, stop))
+                for chunk_start in range(start, stop, chunk_size))
+    table_name, where_str, params = spectrum_table_sql(spectrum_handle, *wavelength_window_sql(request))
+    return keyset_chunks(database, select_str=spectrum_select_str(database, table_name), key_column='wavelength_um',
+                         where_str=where_str, params=params, chunk_size=chunk_size)
+
+
+def read_spectrum_row(spectrum_url_name: str, wavelength_um: float) -> dict:
+    database, spectrum_handle = spectrum_table(spectrum_url_name)
+    columns = read_spectrum_columns(database, spectrum_handle)
+    if columns is not None:
+        index = int(np.searchsorted(columns['wavelength_um'], wavelength_um))
+        if index == len(columns['wavelength_um']) or columns['wavelength_um'][index] != wavelength_um:
+            raise NotFound()
+        return dict(zip(spectrum_fields, column_rows(columns, index, index + 1)[0]))
+    table_name, where_str, params = spectrum_table_sql(spectrum_handle, ' WHERE wavelength_um = %s', [wavelength_um])
+    with read_cursor(database) as cursor:
+        cursor.execute(f'{spectrum_select_str(database, table_name)}{where_str}', params)
+        row = cursor.fetchone()
+    if row is None:
+        raise NotFound()
+    return dict(zip(spectrum_fields, row))
+
+
+def read_handle_indexed_rows(database: str, spectrum_handles: list[str], request) -> list[tuple]:
+    """
+    The (handle_index, wavelength_um, flux, flux_error) rows of several spectra in one database,
+    with a single UNION ALL query, handle_index is the index of the spectrum in spectrum_handles.
+    """
+    if manifest['spectra_layout'] == 'blob':
+        spectra = read_spectrum_blobs(database, spectrum_handles)
+        return [(handle_index, *row) for handle_index, spectrum_handle in enumerate(spectrum_handles)
+                for row in column_rows(spectra[spectrum_handle], *window_slice(spectra[spectrum_handle], request))]
+    window_where_str, window_params = wavelength_window_sql(request)
+    select_strs = []
+    all_params = []
+    for handle_index, spectrum_handle in enumerate(spectrum_handles):
+        table_name, where_str, params = spectrum_table_sql(spectrum_handle, window_where_str, window_params)
+        select_strs.append(f"SELECT {handle_index} AS handle_index, {', '.join(spectrum_fields)} " +
+                           f"FROM {quote_name(database, table_name)}{where_str}")
+        all_params.extend(params)
+    with read_cursor(database) as cursor:
+        cursor.execute(' UNION ALL '.join(select_strs), all_params)
+        return cursor.fetchall()
+
+
+def isotopologue_select_str(database: str, table_name: str, molecule: str) -> tuple[str, list[str]]:
+    # the columns are named as the fields of the former isotopologue models, some differ from the table's columns
+    field_names = [field_name for field_name, _field in isotopologue_fields[molecule]]
+    columns_str = ', '.join(f'{quote_name(database, field.db_column or field_name)} AS '
+                            f'{quote_name(database, field_name)}'
+                            for field_name, field in isotopologue_fields[molecule])
+    return f'SELECT {columns_str} FROM {quote_name(database, table_name)}', field_names
+
+
+def read_isotopologue_rows(isotopologue_url_name: str, request) -> tuple[list[str], list[tuple]]:
+    """ The field names, and the rows of an isotopologue's lines in the optional window. """
+    database, table_name, molecule = isotopologue_table(isotopologue_url_name)
+    select_str, field_names = isotopologue_select_str(database, table_name, molecule)
+    where_str, params = wavelength_window_sql(request)
+    with read_cursor(database) as cursor:
+        cursor.execute(f'{select_str}{where_str}', params)
+        return field_names, cursor.fetchall()
+
+
+def isotopologue_row_chunks(isotopologue_url_name: str, request,
+                            chunk_size: int) -> tuple[list[str], Iterator[list[tuple]]]:
+    """ The field names, and the rows of read_isotopologue_rows() in chunks, in primary key order. """
+    database, table_name, molecule = isotopologue_table(isotopologue_url_name)
+    select_str, field_names = isotopologue_select_str(database, table_name, molecule)
+    primary_key_name, primary_key_field = isotopologue_fields[molecule][0]
+    primary_key_column = quote_name(database, primary_key_field.db_column or primary_key_name)
+    where_str, params = wavelength_window_sql(request)
+    return field_names, keyset_chunks(database, select_str=select_str, key_column=primary_key_column,
+                                      where_str=where_str, params=params, chunk_size=chunk_size)
+
+
+def read_isotopologue_row(isotopologue_url_name: str, pk: int) -> dict:
+    database, table_name, molecule = isotopologue_table(isotopologue_url_name)
+    select_str, field_names = isotopologue_select_str(database, table_name, molecule)
+    primary_key_name, primary_key_field = isotopologue_fields[molecule][0]
+    primary_key_column = quote_name(database, primary_key_field.db_column or primary_key_name)
+    with read_cursor(database) as cursor:
+        cursor.execute(f'{select_str} WHERE {primary_key_column} = %s', [pk])
+        row = cursor.fetchone()
+    if row is None:
+        raise NotFound()
+    return dict(zip(field_names, row))
+
+
+def read_isotopologue_columns(isotopologue_url_name: str, field_names: tuple[str, ...]) -> dict[str, np.ndarray]:
+    """ Numeric fields of all of an isotopologue's lines as float64 column arrays, in wavelength order. """
+    database, table_name, molecule = isotopologue_table(isotopologue_url_name)
+    fields = dict(isotopologue_fields[molecule])
+    columns_str = ', '.join(quote_name(database, fields[field_name].db_column or field_name)
+                            for field_name in field_names)
+    with read_cursor(database) as cursor:
+        cursor.execute(f'SELECT {columns_str} FROM {quote_name(database, table_name)} ORDER BY wavelength_um')
+        data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, len(field_names))
+    return {field_name: np.ascontiguousarray(data[:, column_index])
+            for column_index, field_name in enumerate(field_names)}
+
+
+def read_isotopologue_rows_by_pk(isotopologue_url_name: str, pks: list[int]) -> list[dict]:
+    """ The lines with the given primary keys, in wavelength order. """
+    if not pks:
+        return []
+    database, table_name, molecule = isotopologue_table(isotopologue_url_name)
+    select_str, field_names = isotopologue_select_str(database, table_name, molecule)
+    primary_key_name, primary_key_field = isotopologue_fields[molecule][0]
+    primary_key_column = quote_name(database, primary_key_field.db_column or primary_key_name)
+    with read_cursor(database) as cursor:
+        cursor.execute(f"{select_str} WHERE {primary_key_column} IN ({', '.join(['%s'] * len(pks))}) "
+                       f"ORDER BY wavelength_um", pks)
+        return [dict(zip(field_names, row)) for row in cursor.fetchall()]
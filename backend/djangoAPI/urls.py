@@ -1,12 +1,52 @@
-from django.urls import include, path
+from django.urls import include, path, register_converter
 from rest_framework import routers
+from rest_framework.urlpatterns import format_suffix_patterns
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
 
 from . import views
+from .tables import spectrum_exists, isotopologue_exists
 
-# define the router
+
+class SpectrumHandleConverter:
+    """ A spectrum handle of the manifest, other names do not match the URL, so they are a 404 before any view. """
+    regex = '[^/.]+'
+
+    def to_python(self, value: str) -> str:
+        if not spectrum_exists(value):
+            raise ValueError(value)
+        return value
+
+    def to_url(self, value: str) -> str:
+        return value
+
+
+class IsotopologueConverter(SpectrumHandleConverter):
+    """ An isotopologue of the manifest. """
+    def to_python(self, value: str) -> str:
+        if not isotopologue_exists(value):
+            raise ValueError(value)
+        return value
+
+
+class LookupValueConverter:
+    """ The router's default lookup_value_regex, without '.' so that a format suffix can follow. """
+    regex = '[^/.]+'
+
+    def to_python(self, value: str) -> str:
+        return value
+
+    def to_url(self, value: str) -> str:
+        return value
+
+
+register_converter(SpectrumHandleConverter, 'spectrum_handle')
+register_converter(IsotopologueConverter, 'isotopologue')
+register_converter(LookupValueConverter, 'lookup_value')
+
+# define the router, the API root also lists the spectra and isotopologues
 router = routers.DefaultRouter()
+router.APIRootView = views.APIRootView
 
 """
 Static API URLs
@@ -25,14 +65,23 @@ router.register(r'default_spectrum_info', views.DefaultSpectrumInfoViewSet)
 """
 Dynamic API URLs
 """
-# isotopologue
-for molecule in sorted(views.isotopologue_views.keys()):
-    for isotopologue in sorted(views.isotopologue_views[molecule].keys()):
-        router.register(f'isotopologue_{isotopologue.lower()}', views.isotopologue_views[molecule][isotopologue])
-
-# spectra
-for spectrum_handle in sorted(views.spectra_views.keys()):
-    router.register(f'{spectrum_handle.lower()}', views.spectra_views[spectrum_handle])
+# one view each for all the isotopologues and all the spectra, the table is found from the URL at request time,
+# the converters only match the names in the manifest, and '.json' (or another format) may be added to the URL
+isotopologue_list = views.IsotopologueViewSet.as_view({'get': 'list'})
+isotopologue_detail = views.IsotopologueViewSet.as_view({'get': 'retrieve'})
+isotopologue_strongest = views.StrongestLinesViewSet.as_view({'get': 'list'})
+spectrum_list = views.SpectrumViewSet.as_view({'get': 'list'})
+spectrum_detail = views.SpectrumViewSet.as_view({'get': 'retrieve'})
+dynamic_urlpatterns = format_suffix_patterns([
+    path('isotopologue_<isotopologue:isotopologue>/', isotopologue_list, name='isotopologue-list'),
+    path('isotopologue_<isotopologue:isotopologue>/strongest/', isotopologue_strongest,
+         name='isotopologue-strongest'),
+    path('isotopologue_<isotopologue:isotopologue>/<lookup_value:pk>/', isotopologue_detail,
+         name='isotopologue-detail'),
+    # after the other URLs, a spectrum handle that is also the name of another endpoint is not reachable
+    path('<spectrum_handle:spectrum_handle>/', spectrum_list, name='spectrum-list'),
+    path('<spectrum_handle:spectrum_handle>/<lookup_value:pk>/', spectrum_detail, name='spectrum-detail'),
+])
 
 
 """
@@ -50,7 +99,14 @@ Tables with duplicated information in other tables, these are raw versions of th
 URL Patterns
 """
 urlpatterns = [path('', include(router.urls)),
-               path('datadownload/', views.download_spectra),
+               path('bootstrap/', views.BootstrapView.as_view(), name='bootstrap'),
+               path('spectra_batch/', views.SpectraBatchView.as_view(), name='spectra_batch'),
+               path('cone_search/', views.ConeSearchView.as_view(), name='cone_search'),
+               path('name_search/', views.NameSearchView.as_view(), name='name_search'),
+               path('metrics/', views.MetricsView.as_view(), name='metrics'),
+               path('profiles/', views.ProfileListView.as_view(), name='profiles'),
+               path('profiles/<str:name>/', views.ProfileDownloadView.as_view(), name='profile'),
+               path('datadownload/', views.download_spectra, name='datadownload'),
                path('users/token/', TokenObtainPairView.as_view()),
                path('users/token/refresh/', TokenRefreshView.as_view()),
                path('users/token/verify/', TokenVerifyView.as_view()),
@@ -58,4 +114,5 @@ urlpatterns = [path('', include(router.urls)),
                path('users/me', views.RetrieveUserView.as_view()),
                path('change-password/', views.ChangePasswordView.as_view(), name='change-password'),
                path('password_reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
+               *dynamic_urlpatterns,
                ]
@@ -1,5 +1,13 @@
-from django.http import HttpResponse
-from rest_framework import viewsets, permissions
+import hmac
+import os
+from typing import Callable, Iterator
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import viewsets, permissions, routers, serializers
 
 from rest_framework.decorators import api_view
 
@@ -7,22 +15,43 @@ from rest_framework.decorators import api_view
 from rest_framework.views import APIView
 
 from rest_framework import status, generics
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
-from rest_framework.permissions import IsAuthenticated
-
-from .dynamic_data import (dispatch, schema_prefix,
-                           available_spectra_to_database, available_isotopologues_to_database)
-from .models import spectra_models, isotopologue_models, \
-    AvailableIsotopologues, \
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+
+from core.throttling import SpectraBytesThrottle
+from science.db.sql import str_is_true
+from science.tools.decimate import decimate_columns
+from science.tools.line_strength import default_temperature_k, line_strength, strongest_per_bin
+from science.tools.sky_index import cone_bucket_ids, angular_distance_deg
+
+from .bootstrap import PrebuiltDocument
+from .caching import GenerationCachedMixin, GenerationVersionedView, accepts_gzip
+from .generation import data_generation
+from .line_columns import line_columns, primary_key_name
+from .metrics import request_metrics
+from .profiling import profile_store
+from .replicas import ReplicaReadMixin, replica_set
+from .name_index import name_index
+from .dynamic_data import dispatch, download_cache, schema_prefix, available_spectra_to_database
+from .models import AvailableIsotopologues, \
     AvailableFloatParams, AvailableSpectrumParams, \
     AvailableStrParams, Curated, DjangoMigrations, \
     FluxCalibration, LineFluxesCo, \
     ObjectNameAliases, ObjectParamsFloat, ObjectParamsStr, Spectra, \
     StackedLineSpectra, AvailableParamsAndUnits, DefaultSpectrum, DefaultSpectrumInfo, \
-    StatsTotal, StatsInstrument
-from .serializers import spectra_serializers, isotopologue_serializers, \
-    AvailableIsotopologuesSerializer, \
+    StatsTotal, StatsInstrument, SkyIndex
+from .filters import CuratedParamFilterBackend
+from .pagination import CuratedCursorPagination
+from .query_params import positive_int_query_param, float_query_param, fields_query_param, wavelength_window, \
+    wavelength_window_bounds, orient_query_param, stream_query_param
+from .renderers import binary_renderer_classes, binary_formats, spectrum_arrays, arrays_to_lists, \
+    SpectrumBinaryRenderer
+from .streaming import stream_chunk_size, keyset_ordering, queryset_chunks, streaming_rows_response
+from .serializers import AvailableIsotopologuesSerializer, \
     AvailableFloatParamsSerializer, \
     AvailableSpectrumParamsSerializer, AvailableStrParamsSerializer, CuratedSerializer, \
     DjangoMigrationsSerializer, \
@@ -31,99 +60,553 @@ from .serializers import spectra_serializers, isotopologue_serializers, \
     ObjectParamsStrSerializer, SpectraSerializer, StackedLineSpectraSerializer, \
     AvailableParamsAndUnitsSerializer, DefaultSpectrumSerializer, DefaultSpectrumInfoSerializer, \
     UserCreateSerializer, UserSerializer, StatsTotalSerializer, StatsInstrumentSerializer, ChangePasswordSerializer
+from .tables import spectrum_fields, read_spectrum_rows, read_spectrum_row, read_handle_indexed_rows, \
+    read_isotopologue_rows, read_isotopologue_row, read_isotopologue_rows_by_pk, spectrum_row_chunks, \
+    isotopologue_row_chunks, read_spectrum_file, read_spectrum_window_columns, window_columns, spectrum_exists, \
+    isotopologue_exists, spectrum_handles_by_url_name, isotopologues_by_url_name
+
+
+def oriented_rows(field_names: list[str], rows: list[tuple], orient: str) -> list[dict] | dict[str, tuple]:
+    """ The rows as a list of {field: value} records, or as {field: [values]} columns. """
+    if orient == 'columns':
+        columns = zip(*rows) if rows else ([] for _field_name in field_names)
+        return dict(zip(field_names, columns))
+    return [dict(zip(field_names, row)) for row in rows]
+
+
+def value_formatters(model, field_names: list[str]) -> dict[int, Callable]:
+    """
+    The serializer's representation of the date and time columns by column index, so that values_list() rows
+    are rendered like the ModelSerializer rendered them, and not in the format of the JSON encoder.
+    """
+    formatters = {}
+    for column_index, field_name in enumerate(field_names):
+        model_field = model._meta.get_field(field_name)
+        if isinstance(model_field, models.DateTimeField):
+            formatters[column_index] = serializers.DateTimeField().to_representation
+        elif isinstance(model_field, models.DateField):
+            formatters[column_index] = serializers.DateField().to_representation
+    return formatters
+
+
+def formatted_rows(rows: list[tuple], formatters: dict[int, Callable]) -> list[tuple]:
+    if not formatters:
+        return rows
+    return [tuple(value if value is None or column_index not in formatters else formatters[column_index](value)
+                  for column_index, value in enumerate(row))
+            for row in rows]
+
+
 """
 Dynamic Views
 """
-isotopologue_views = {}
-for molecule in sorted(isotopologue_models.keys()):
-    isotopologue_views[molecule] = {}
-    for isotopologue in sorted(isotopologue_models[molecule].keys()):
-        view_name = f'Isotopologue{isotopologue}ViewSet'
-        database_this_isotopologue = available_isotopologues_to_database[molecule][isotopologue]
-        queryset = isotopologue_models[molecule][isotopologue].objects.using(database_this_isotopologue).all()
-        serializer_class = isotopologue_serializers[molecule][isotopologue]
-        iso_view = type(view_name, (viewsets.ReadOnlyModelViewSet,), dict(__module__='views', queryset=queryset,
-                                                                          serializer_class=serializer_class))
-        isotopologue_views[molecule][isotopologue] = iso_view
-
-
-spectrum_fields = ('wavelength_um', 'flux', 'flux_error')
-
-
-spectra_views = {}
-for spectrum_handle in sorted(spectra_models.keys()):
-    def list(self, request):
-        return Response(data={key: data_array for key, data_array in
-                              zip(spectrum_fields, zip(*self.queryset.values_list(*spectrum_fields)))},
-                        status=status.HTTP_200_OK)
 
 
-    view_name = f'{spectrum_handle.lower()}ViewSet'
-    database_this_handle = available_spectra_to_database[spectrum_handle]
-    queryset = spectra_models[spectrum_handle].objects.using(database_this_handle).order_by('pk')
-    spectra_views[spectrum_handle] = type(view_name,
-                                          (viewsets.ReadOnlyModelViewSet,),
-                                          dict(__module__='views',
-                                               queryset=queryset,
-                                               serializer_class=spectra_serializers[spectrum_handle],
-                                               throttle_scope='spectra',
-                                               list=list))
+class WavelengthWindowMixin:
+    """
+    Optional 'min_um' and 'max_um' query parameters, these compile to an indexed BETWEEN on wavelength_um.
+    """
+    def get_queryset(self):
+        return wavelength_window(super().get_queryset(), self.request)
+
+
+class SpectrumListMixin(WavelengthWindowMixin):
+    """
+    The list() for spectrum tables, returned as one array per column.
+    JSON by default, or a binary format with '?format=bin', '?format=npy' or 'Accept: application/octet-stream'.
+
+    Optional query parameters:
+        min_um, max_um: only return the data in this wavelength window.
+        max_points: decimate the spectrum to about this many points, keeping the minimum and
+                    maximum flux per wavelength bin and the gaps between spectral segments.
+        stream: 'jsonl' or 'array', stream the JSON rows in wavelength order, see streaming.py.
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, *binary_renderer_classes]
+
+    def get_spectrum_rows(self) -> list[tuple]:
+        return list(self.get_queryset().values_list(*spectrum_fields))
+
+    def get_spectrum_row_chunks(self) -> Iterator[list[tuple]]:
+        queryset = self.get_queryset()
+        return queryset_chunks(queryset, field_names=list(spectrum_fields), ordering=keyset_ordering(queryset))
+
+    def get_spectrum_columns(self) -> dict[str, np.ndarray] | None:
+        # the column arrays in the window when the spectrum is read without row fetches, see SpectrumViewSet
+        return None
+
+    def list(self, request, *args, **kwargs):
+        max_points = positive_int_query_param(request, 'max_points')
+        stream_format = stream_query_param(request)
+        if stream_format is not None:
+            if max_points is not None:
+                raise ValidationError({'stream': 'A decimated (max_points) spectrum can not be streamed.'})
+            return streaming_rows_response(list(spectrum_fields), self.get_spectrum_row_chunks(),
+                                           stream_format=stream_format)
+        is_binary = request.accepted_renderer.format in binary_formats
+        columns = self.get_spectrum_columns()
+        if columns is None:
+            rows = self.get_spectrum_rows()
+            if max_points is None and not is_binary:
+                return Response(data={key: data_array for key, data_array in zip(spectrum_fields, zip(*rows))},
+                                status=status.HTTP_200_OK)
+            columns = spectrum_arrays(rows)
+        if max_points is not None:
+            columns = decimate_columns(columns, max_points=max_points)
+        if is_binary:
+            return Response(data=columns, status=status.HTTP_200_OK)
+        return Response(data=arrays_to_lists(columns), status=status.HTTP_200_OK)
+
+
+class SpectrumViewSet(GenerationCachedMixin, SpectrumListMixin, viewsets.ViewSet):
+    """
+    Any spectrum, /api/<spectrum_handle>/, the handle is resolved to its table at request time.
+    """
+    throttle_scope = 'spectra'
+
+    @classmethod
+    def url_kwargs_exist(cls, url_kwargs: dict) -> bool:
+        return spectrum_exists(url_kwargs['spectrum_handle'])
+
+    def get_spectrum_rows(self) -> list[tuple]:
+        return read_spectrum_rows(self.kwargs['spectrum_handle'], self.request)
+
+    def get_spectrum_row_chunks(self) -> Iterator[list[tuple]]:
+        return spectrum_row_chunks(self.kwargs['spectrum_handle'], self.request, chunk_size=stream_chunk_size)
+
+    def get_spectrum_columns(self) -> dict[str, np.ndarray] | None:
+        return read_spectrum_window_columns(self.kwargs['spectrum_handle'], self.request)
+
+    def retrieve(self, request, spectrum_handle=None, pk=None, format=None):
+        try:
+            wavelength_um = float(pk)
+        except ValueError:
+            raise NotFound()
+        return Response(data=read_spectrum_row(spectrum_handle, wavelength_um), status=status.HTTP_200_OK)
+
+
+class IsotopologueViewSet(GenerationCachedMixin, viewsets.ViewSet):
+    """
+    Any isotopologue's HITRAN lines, /api/isotopologue_<isotopologue>/, with the optional 'min_um' and 'max_um',
+    'orient', see ValuesListMixin, and 'stream', see streaming.py.
+    """
+    @classmethod
+    def url_kwargs_exist(cls, url_kwargs: dict) -> bool:
+        return isotopologue_exists(url_kwargs['isotopologue'])
+
+    def list(self, request, isotopologue=None, format=None):
+        stream_format = stream_query_param(request)
+        if stream_format is not None:
+            field_names, chunks = isotopologue_row_chunks(isotopologue, request, chunk_size=stream_chunk_size)
+            return streaming_rows_response(field_names, chunks, stream_format=stream_format)
+        orient = orient_query_param(request)
+        field_names, rows = read_isotopologue_rows(isotopologue, request)
+        return Response(data=oriented_rows(field_names, rows, orient=orient), status=status.HTTP_200_OK)
+
+    def retrieve(self, request, isotopologue=None, pk=None, format=None):
+        try:
+            index = int(pk)
+        except ValueError:
+            raise NotFound()
+        return Response(data=read_isotopologue_row(isotopologue, index), status=status.HTTP_200_OK)
+
+
+max_line_pixels = 4000
+
+
+class StrongestLinesViewSet(GenerationCachedMixin, viewsets.ViewSet):
+    """
+    The strongest HITRAN lines of an isotopologue for labeling a plot, /api/isotopologue_<isotopologue>/strongest/,
+    with the query parameters:
+        min_um, max_um: the plotted wavelength window, the default is all the lines.
+        pixels: the plot width in pixels, at most one line is returned per pixel, default 1000.
+        temperature_k: the gas temperature used to rank the lines, default 1000 K.
+    Each line has an added 'strength' field, relative to the other lines in the same response.
+    """
+    @classmethod
+    def url_kwargs_exist(cls, url_kwargs: dict) -> bool:
+        return isotopologue_exists(url_kwargs['isotopologue'])
+
+    def list(self, request, isotopologue=None, format=None):
+        min_um, max_um = wavelength_window_bounds(request)
+        num_pixels = min(positive_int_query_param(request, 'pixels') or 1000, max_line_pixels)
+        temperature_k = float_query_param(request, 'temperature_k')
+        if temperature_k is None:
+            temperature_k = default_temperature_k
+        elif temperature_k <= 0.0:
+            return Response(data={'temperature_k': 'Expected a positive temperature in Kelvin.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        columns = line_columns.get(isotopologue)
+        wavelength_um = columns['wavelength_um']
+        if len(wavelength_um) == 0:
+            return Response(data=[], status=status.HTTP_200_OK)
+        if min_um is None:
+            min_um = wavelength_um[0]
+        if max_um is None:
+            max_um = wavelength_um[-1]
+        strength = line_strength(einstein_a=columns['einstein_a'],
+                                 g_upper=columns['g_statistical_weight_upper_level'],
+                                 upper_level_energy_k=columns['upper_level_energy'], temperature_k=temperature_k)
+        indices = strongest_per_bin(wavelength_um=wavelength_um, strength=strength, min_um=min_um, max_um=max_um,
+                                    num_bins=num_pixels)
+        strength_by_pk = dict(zip(columns['pk'][indices].tolist(), strength[indices].tolist()))
+        lines = read_isotopologue_rows_by_pk(isotopologue, list(strength_by_pk.keys()))
+        pk_name = primary_key_name(isotopologue)
+        for line in lines:
+            line['strength'] = strength_by_pk[line[pk_name]]
+        return Response(data=lines, status=status.HTTP_200_OK)
+
+
+max_batch_spectra = 50
+
+
+def read_spectra(spectrum_handles: list[str], request) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Read several spectra as column arrays, from their memory-mapped files or with one UNION ALL query per database,
+    applying the optional 'min_um', 'max_um' and 'max_points' query parameters to each spectrum.
+    """
+    max_points = positive_int_query_param(request, 'max_points')
+    spectra = {}
+    handles_by_database = {}
+    for spectrum_handle in spectrum_handles:
+        columns = read_spectrum_file(spectrum_handle)
+        if columns is None:
+            database = available_spectra_to_database[spectrum_handle]
+            handles_by_database.setdefault(database, []).append(spectrum_handle)
+        else:
+            spectra[spectrum_handle] = window_columns(columns, request)
+    for database, handles_this_database in handles_by_database.items():
+        rows = read_handle_indexed_rows(database=database, spectrum_handles=handles_this_database, request=request)
+        rows = np.array(rows, dtype=np.float64).reshape(-1, len(spectrum_fields) + 1)
+        for handle_index, spectrum_handle in enumerate(handles_this_database):
+            rows_this_handle = rows[rows[:, 0] == handle_index, 1:]
+            rows_this_handle = rows_this_handle[np.argsort(rows_this_handle[:, 0], kind='stable')]
+            spectra[spectrum_handle] = spectrum_arrays(rows_this_handle)
+    if max_points is not None:
+        spectra = {spectrum_handle: decimate_columns(columns, max_points=max_points)
+                   for spectrum_handle, columns in spectra.items()}
+    return {spectrum_handle: spectra[spectrum_handle] for spectrum_handle in spectrum_handles}
+
+
+class SpectraBatchView(APIView):
+    """
+    Several spectra in one request, '?spectra=handle_1%handle_2' (the same separator as the data download),
+    with the optional 'min_um', 'max_um' and 'max_points' query parameters of the per-spectrum endpoints.
+    JSON by default, or a single binary frame with '?format=bin', see renderers.pack_spectra().
+
+    This counts as one request for the 'spectra' throttle scope,
+    and the size of the response counts towards the 'spectra_bytes' rate.
+    """
+    throttle_scope = 'spectra'
+    throttle_classes = [*api_settings.DEFAULT_THROTTLE_CLASSES, SpectraBytesThrottle]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, SpectrumBinaryRenderer]
+
+    def get(self, request):
+        spectra_str = request.query_params.get('spectra')
+        if not spectra_str:
+            return Response(data={'spectra': 'Expected one or more spectrum handles separated by %.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # remove duplicates, but keep the requested order
+        requested_handles = list(dict.fromkeys(spectra_str.lower().split('%')))
+        if len(requested_handles) > max_batch_spectra:
+            return Response(data={'spectra': f'At most {max_batch_spectra} spectra per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        unknown_handles = [spectrum_handle for spectrum_handle in requested_handles
+                           if spectrum_handle not in available_spectra_to_database.keys()]
+        if unknown_handles:
+            return Response(data={'unknown_spectra': unknown_handles}, status=status.HTTP_404_NOT_FOUND)
+        spectra = read_spectra(spectrum_handles=requested_handles, request=request)
+        if request.accepted_renderer.format in binary_formats:
+            data = spectra
+        else:
+            data = {spectrum_handle: arrays_to_lists(columns) for spectrum_handle, columns in spectra.items()}
+        response = Response(data=data, status=status.HTTP_200_OK)
+        response.add_post_render_callback(
+            lambda rendered: SpectraBytesThrottle().charge(request, self, num_bytes=len(rendered.content)))
+        return response
+
 
 """
 Static Views
 """
 
 
-class StatsTotalViewSet(viewsets.ReadOnlyModelViewSet):
+class ValuesListMixin:
+    """
+    list() straight from values_list(), without the per-field work of the serializer, for the read-only viewsets
+    that serialize all the fields of the model as they are. Paginated requests still use the serializer.
+
+    Optional query parameters:
+        orient: 'records' (the default) for a list of {field: value} rows, or 'columns' for {field: [values]},
+                which does not repeat the field names in every row.
+        stream: 'jsonl' or 'array', stream the rows in the order of the list, see streaming.py. This is a 400
+                with page_size, and for a queryset that is not ordered by a single unique field.
+    """
+    def get_values_fields(self) -> list[str]:
+        return [field.name for field in self.queryset.model._meta.concrete_fields]
+
+    def list(self, request, *args, **kwargs):
+        orient = orient_query_param(request)
+        stream_format = stream_query_param(request)
+        if self.paginator is not None and self.paginator.get_page_size(request) is not None:
+            if stream_format is not None:
+                raise ValidationError({'stream': 'A streamed list is not paginated, leave out page_size.'})
+            return super().list(request, *args, **kwargs)
+        field_names = self.get_values_fields()
+        formatters = value_formatters(self.queryset.model, field_names)
+        if stream_format is not None:
+            queryset = self.filter_queryset(self.get_queryset())
+            try:
+                ordering = keyset_ordering(queryset)
+            except ValueError as error:
+                raise ValidationError({'stream': str(error)})
+            chunks = queryset_chunks(queryset, field_names=field_names, ordering=ordering)
+            return streaming_rows_response(field_names, (formatted_rows(rows, formatters) for rows in chunks),
+                                           stream_format=stream_format)
+        rows = formatted_rows(list(self.filter_queryset(self.get_queryset()).values_list(*field_names)), formatters)
+        return Response(data=oriented_rows(field_names, rows, orient=orient), status=status.HTTP_200_OK)
+
+
+class FieldsProjectionMixin:
+    """
+    Optional '?fields=a,b,c' query parameter, only these columns (and the primary key) are selected and returned.
+    """
+    def get_projected_fields(self) -> list[str] | None:
+        model_meta = self.queryset.model._meta
+        fields = fields_query_param(self.request, allowed_fields={field.name for field in model_meta.concrete_fields})
+        if fields is None:
+            return None
+        # the primary key identifies each row, so it is always returned
+        return [model_meta.pk.name, *(field for field in fields if field != model_meta.pk.name)]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_projected_fields()
+        if fields is not None:
+            queryset = queryset.only(*fields)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_projected_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_fields(self) -> list[str]:
+        return self.get_projected_fields() or super().get_values_fields()
+
+
+class StatsTotalViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = StatsTotal.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = StatsTotalSerializer
 
 
-class StatsInstrumentViewSet(viewsets.ReadOnlyModelViewSet):
+class StatsInstrumentViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = StatsInstrument.objects.using(f'{schema_prefix}spexodisks').order_by('order_index')
     serializer_class = StatsInstrumentSerializer
 
 
-class AvailableParamsAndUnitsViewSet(viewsets.ReadOnlyModelViewSet):
+class AvailableParamsAndUnitsViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin,
+                                     viewsets.ReadOnlyModelViewSet):
     queryset = AvailableParamsAndUnits.objects.using(f'{schema_prefix}spexodisks').order_by('pk')
     serializer_class = AvailableParamsAndUnitsSerializer
 
 
-class DefaultSpectrumViewSet(viewsets.ReadOnlyModelViewSet):
+class DefaultSpectrumViewSet(GenerationCachedMixin, ReplicaReadMixin, SpectrumListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = DefaultSpectrum.objects.using(f'{schema_prefix}spexodisks').order_by('pk')
     serializer_class = DefaultSpectrumSerializer
 
-    def list(self, request):
-        return Response(data={key: data_array for key, data_array in
-                              zip(spectrum_fields, zip(*self.queryset.values_list(*spectrum_fields)))},
-                        status=status.HTTP_200_OK)
-
 
-class DefaultSpectrumInfoViewSet(viewsets.ReadOnlyModelViewSet):
+class DefaultSpectrumInfoViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin,
+                                 viewsets.ReadOnlyModelViewSet):
     queryset = DefaultSpectrumInfo.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = DefaultSpectrumInfoSerializer
 
 
-class AvailableIsotopologuesViewSet(viewsets.ReadOnlyModelViewSet):
+class AvailableIsotopologuesViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin,
+                                    viewsets.ReadOnlyModelViewSet):
     queryset = AvailableIsotopologues.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = AvailableIsotopologuesSerializer
 
 
-class SpectraViewSet(viewsets.ReadOnlyModelViewSet):
+class SpectraViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Spectra.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = SpectraSerializer
 
 
-class CuratedViewSet(viewsets.ReadOnlyModelViewSet):
+class CuratedViewSet(GenerationCachedMixin, ReplicaReadMixin, FieldsProjectionMixin, ValuesListMixin,
+                     viewsets.ReadOnlyModelViewSet):
+    """
+    The curated stellar parameters, one row per star with the _value, _err_low, _err_high, and _ref
+    columns of each parameter. '?fields=' limits the columns and '?page_size=' pages through the stars.
+    The rows can be filtered on the parameter values, for example '?teff_value__gte=4000', see filters.py.
+    """
     queryset = Curated.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = CuratedSerializer
+    pagination_class = CuratedCursorPagination
+    filter_backends = [CuratedParamFilterBackend]
 
 
-class ObjectNameAliasesViewSet(viewsets.ReadOnlyModelViewSet):
+class ObjectNameAliasesViewSet(GenerationCachedMixin, ReplicaReadMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = ObjectNameAliases.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = ObjectNameAliasesSerializer
 
 
+# the endpoints that the Explore page requests for its first paint
+bootstrap_viewsets = {
+    'stats_total': StatsTotalViewSet,
+    'stats_instrument': StatsInstrumentViewSet,
+    'available_isotopologues': AvailableIsotopologuesViewSet,
+    'available_params_and_units': AvailableParamsAndUnitsViewSet,
+    'default_spectrum': DefaultSpectrumViewSet,
+    'default_spectrum_info': DefaultSpectrumInfoViewSet,
+}
+
+
+def build_bootstrap() -> dict:
+    """ The list() data of each of the bootstrap_viewsets, keyed by the endpoint name. """
+    document = {}
+    for endpoint_name, viewset in bootstrap_viewsets.items():
+        queryset = viewset.queryset.all()
+        if issubclass(viewset, SpectrumListMixin):
+            rows = list(queryset.values_list(*spectrum_fields))
+            document[endpoint_name] = {key: data_array for key, data_array in zip(spectrum_fields, zip(*rows))}
+        else:
+            document[endpoint_name] = viewset.serializer_class(queryset, many=True).data
+    return document
+
+
+bootstrap_document = PrebuiltDocument(build=build_bootstrap)
+
+
+class APIRootView(routers.APIRootView):
+    """ The router's endpoints, then each isotopologue and spectrum of the manifest, /api/. """
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        for isotopologue_url_name in sorted(isotopologues_by_url_name.keys()):
+            response.data[f'isotopologue_{isotopologue_url_name}'] = reverse(
+                'isotopologue-list', kwargs={'isotopologue': isotopologue_url_name}, request=request,
+                format=kwargs.get('format'))
+        for spectrum_url_name in sorted(spectrum_handles_by_url_name.keys()):
+            response.data[spectrum_url_name] = reverse(
+                'spectrum-list', kwargs={'spectrum_handle': spectrum_url_name}, request=request,
+                format=kwargs.get('format'))
+        return response
+
+
+class BootstrapView(GenerationVersionedView, APIView):
+    """
+    Everything the Explore page needs for its first paint in one request, /api/bootstrap/,
+    a JSON object with the same data as each of the endpoints in bootstrap_viewsets, keyed by the endpoint name.
+    The document is built once per data generation and sent gzip compressed to clients that accept it.
+    """
+    gzip_variants = True
+
+    def get(self, request):
+        document = bootstrap_document.get()
+        if accepts_gzip(request):
+            response = HttpResponse(content=document.gzip, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(content=document.json, content_type='application/json')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+max_name_matches = 100
+
+
+class NameSearchView(APIView):
+    """
+    Resolve an object name, '?q=<name>&exact=true', or autocomplete a partial name, '?q=<start of a name>&limit=20'.
+    Any SIMBAD alias, popular name, or spexodisks handle matches, ignoring case and spaces.
+    Returns the matching objects as {spexodisks_handle, pop_name, matched_name}.
+    """
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(data={'q': 'Expected a name or the start of a name.'}, status=status.HTTP_400_BAD_REQUEST)
+        current_name_index = name_index.get()
+        if str_is_true(request.query_params.get('exact', 'false')):
+            return Response(data=current_name_index.exact(query), status=status.HTTP_200_OK)
+        limit = min(positive_int_query_param(request, 'limit') or 20, max_name_matches)
+        return Response(data=current_name_index.prefix(query, limit=limit), status=status.HTTP_200_OK)
+
+
+max_cone_radius_arcmin = 600.0
+
+
+class ConeSearchView(APIView):
+    """
+    The objects within a radius of a position, '?ra=<deg>&dec=<deg>&radius_arcmin=<arcmin>' (J2000),
+    nearest first. The candidates are read from the buckets of the sky_index table that overlap the cone,
+    see science/tools/sky_index.py, and then filtered by their exact distance.
+    """
+    def get(self, request):
+        ra_deg = float_query_param(request, 'ra')
+        dec_deg = float_query_param(request, 'dec')
+        radius_arcmin = float_query_param(request, 'radius_arcmin')
+        if ra_deg is None or dec_deg is None or radius_arcmin is None:
+            return Response(data={'detail': "The 'ra', 'dec' (degrees) and 'radius_arcmin' parameters are required."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not -90.0 <= dec_deg <= 90.0:
+            return Response(data={'dec': 'Expected a declination between -90 and 90 degrees.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 0.0 < radius_arcmin <= max_cone_radius_arcmin:
+            return Response(data={'radius_arcmin': f'Expected a radius between 0 and {max_cone_radius_arcmin}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        radius_deg = radius_arcmin / 60.0
+        candidates = list(SkyIndex.objects.using(replica_set.read_alias(f'{schema_prefix}spexodisks'))
+                          .filter(bucket_id__in=cone_bucket_ids(ra_deg, dec_deg, radius_deg))
+                          .values_list('spexodisks_handle', 'ra_deg', 'dec_deg'))
+        if not candidates:
+            return Response(data=[], status=status.HTTP_200_OK)
+        handles, ras_deg, decs_deg = zip(*candidates)
+        distances_arcmin = angular_distance_deg(ra_deg, dec_deg, np.array(ras_deg), np.array(decs_deg)) * 60.0
+        matches = [{'spexodisks_handle': handles[index], 'ra_deg': ras_deg[index], 'dec_deg': decs_deg[index],
+                    'distance_arcmin': float(distances_arcmin[index])}
+                   for index in np.argsort(distances_arcmin, kind='stable')
+                   if distances_arcmin[index] <= radius_arcmin]
+        return Response(data=matches, status=status.HTTP_200_OK)
+
+
+"""
+Monitoring
+"""
+
+
+class MetricsView(APIView):
+    """
+    Request metrics in the Prometheus text format, see metrics.py. The scraper must send API_METRICS_TOKEN
+    as 'Authorization: Bearer <token>', and the metrics are not served at all when the token is not set.
+    """
+    authentication_classes = []
+    throttle_classes = []
+
+    def get(self, request):
+        if not settings.API_METRICS_TOKEN or not hmac.compare_digest(
+                request.META.get('HTTP_AUTHORIZATION', '').encode('utf-8'),
+                f'Bearer {settings.API_METRICS_TOKEN}'.encode('utf-8')):
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(content=request_metrics.exposition(), content_type='text/plain; version=0.0.4')
+
+
+class ProfileListView(APIView):
+    """ The stored request profiles, newest first, see profiling.py. """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(data=[profile_store.describe(name) for name in profile_store.names()],
+                        status=status.HTTP_200_OK)
+
+
+class ProfileDownloadView(APIView):
+    """ Download one stored request profile, a pstats file. """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name=None):
+        path = profile_store.path(name)
+        if path is None:
+            raise NotFound()
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name,
+                            content_type='application/octet-stream')
 
 
 """
@@ -142,8 +625,22 @@ def download_spectra(request):
         return Response(status=status.HTTP_400_BAD_REQUEST)
     current_user = request.user
     if current_user:
-        response = HttpResponse(dispatch.zip_upload(spectra_handles=spectra_list),
-                                content_type='application/zip')
+        # the same selection in any order is the same archive
+        spectra_list = sorted(set(spectra_list))
+        archive_key = download_cache.key(spectra_handles=spectra_list, generation=data_generation.current)
+        archive_path = download_cache.get(archive_key)
+        if archive_path is None:
+            response = StreamingHttpResponse(
+                download_cache.write_stream(archive_key, dispatch.zip_stream(spectra_handles=spectra_list)),
+                content_type='application/zip')
+            # send the archive to the user as it is written, without buffering in nginx
+            response['X-Accel-Buffering'] = 'no'
+        elif settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX:
+            # nginx sends the file, see the internal location in nginx/deploy.conf
+            response = HttpResponse(content_type='application/zip')
+            response['X-Accel-Redirect'] = settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX + os.path.basename(archive_path)
+        else:
+            response = FileResponse(open(archive_path, 'rb'), content_type='application/zip')
         response['Content-Disposition'] = 'attachment; filename=spexodisks.zip'
         return response
     else:
@@ -219,36 +716,36 @@ class ChangePasswordView(generics.UpdateAPIView):
 
 
 # Used tables, but supported tables
-class AvailableFloatParamsViewSet(viewsets.ReadOnlyModelViewSet):
+class AvailableFloatParamsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AvailableFloatParams.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = AvailableFloatParamsSerializer
 
 
-class ObjectParamsStrViewSet(viewsets.ReadOnlyModelViewSet):
+class ObjectParamsStrViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = ObjectParamsStr.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = ObjectParamsStrSerializer
 
 
-class ObjectParamsFloatViewSet(viewsets.ReadOnlyModelViewSet):
+class ObjectParamsFloatViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = ObjectParamsFloat.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = ObjectParamsFloatSerializer
 
 
-class StackedLineSpectraViewSet(viewsets.ReadOnlyModelViewSet):
+class StackedLineSpectraViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = StackedLineSpectra.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = StackedLineSpectraSerializer
 
-class FluxCalibrationViewSet(viewsets.ReadOnlyModelViewSet):
+class FluxCalibrationViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = FluxCalibration.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = FluxCalibrationSerializer
 
 
-class AvailableSpectrumParamsViewSet(viewsets.ReadOnlyModelViewSet):
+class AvailableSpectrumParamsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AvailableSpectrumParams.objects.using(f'{schema_prefix}spexodisks').order_by('pk')
     serializer_class = AvailableSpectrumParamsSerializer
 
 
-class AvailableStrParamsViewSet(viewsets.ReadOnlyModelViewSet):
+class AvailableStrParamsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AvailableStrParams.objects.using(f'{schema_prefix}spexodisks').order_by('pk')
     serializer_class = AvailableStrParamsSerializer
 
@@ -258,6 +755,6 @@ class DjangoMigrationsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = DjangoMigrationsSerializer
 
 
-class LineFluxesCoViewSet(viewsets.ReadOnlyModelViewSet):
+class LineFluxesCoViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = LineFluxesCo.objects.using(f'{schema_prefix}spexodisks').all()
     serializer_class = LineFluxesCoSerializer
\ No newline at end of file
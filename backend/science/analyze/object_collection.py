@@ -21,14 +21,18 @@ from autostar.table_read import num_format
 from autostar.object_params import SingleParam, set_single_param
 from autostar.name_correction import verify_starname, PopNamesLib
 from autostar.simbad_query import StarDict, SimbadLib, handle_to_simbad, SimbadMainRef, simbad_coord_to_deg
-from science.db.sql import LoadSQL
+from science.db.sql import LoadSQL, SPECTRA_STORAGE_LAYOUT
+from science.db.sql_tables import wavelength_index_name, consolidated_spectra_tables, spectrum_files_table
 from science.load.flux_cal import FluxCal
 from science.db.file_sync import rsync_output
 from science.load.line_flux import LineFluxes
 from science.load.import_spectra import AllSpectra
 from science.analyze.single_star import SingleObject
 from science.db.alchemy import UploadSQL, is_good_num
-from science.db.data_status import set_data_status_mysql
+from science.db.spectrum_store import write_spectrum_file, prune_spectrum_files, stored_spectrum_files
+from science.db.data_status import set_data_status_mysql, set_data_generation_mysql
+from science.db.manifest import write_manifest_mysql
+from science.tools.sky_index import sky_bucket_id
 from science.load.ref_rank import rank_ref, rank_per_column
 from science.load.units import UnitsObjectParams, params_check
 from science.analyze.spectrum import (SpectraSummary, set_single_output_spectra, spectra_output_dir_default,
@@ -806,11 +810,17 @@ class ObjectCollection:
         with LoadSQL(auto_connect=True, verbose=self.verbose) as load_sql:
             # faster upload of data to MySQL server, only implemented for spectral data
             uploader = UploadSQL()
+            if SPECTRA_STORAGE_LAYOUT in consolidated_spectra_tables.keys():
+                consolidated_table_name = consolidated_spectra_tables[SPECTRA_STORAGE_LAYOUT]
+                if not load_sql.check_if_table_exists(table_name=consolidated_table_name, database=spectra_schema):
+                    load_sql.creat_table(table_name=consolidated_table_name, database=spectra_schema)
             # create the statistics tables
             load_sql.create_stats_total_table(database=spexo_schema)
             load_sql.create_stats_inst_table(database=spexo_schema)
             # create the stellar names and parameters tables
             load_sql.creat_table(table_name='object_name_aliases', database=spexo_schema)
+            # the positions for cone searches
+            load_sql.creat_table(table_name='sky_index', database=spexo_schema)
             if upload_all_params:
                 load_sql.creat_table(table_name="object_params_float", database=spexo_schema)
                 load_sql.creat_table(table_name="object_params_str", database=spexo_schema)
@@ -841,7 +851,7 @@ class ObjectCollection:
                                     flux=default_spectrum.flux,
                                     flux_error=default_spectrum.flux_error,
                                     bandwidth_fraction_for_null=bandwidth_fraction_for_null,
-                                    schema=spexo_schema)
+                                    schema=spexo_schema, layout='tables')
             load_sql.creat_table(table_name='default_spectrum_info', database=spexo_schema)
             spectrum_data = spectrum_data_for_sql(single_spectrum=default_spectrum)
             load_sql.insert_into_table(table_name='default_spectrum_info', data=spectrum_data, database=spexo_schema)
@@ -1119,6 +1129,14 @@ class ObjectCollection:
                         curated_record[F"{column_name}_ref"] = output_data['ref']
                 # export the curated data to the MySQL server table.
                 load_sql.insert_into_table(table_name='curated', database=spexo_schema, data=curated_record)
+                # the position in the spatial index, used by the API's cone search
+                if 'ra_epochj2000' in params_data.keys() and 'dec_epochj2000' in params_data.keys():
+                    ra_deg = float(params_data['ra_epochj2000'][1]['value'])
+                    dec_deg = float(params_data['dec_epochj2000'][1]['value'])
+                    load_sql.insert_into_table(table_name='sky_index', database=spexo_schema,
+                                               data={'spexodisks_handle': spexodisks_handle,
+                                                     'ra_deg': ra_deg, 'dec_deg': dec_deg,
+                                                     'bucket_id': int(sky_bucket_id(ra_deg, dec_deg))})
 
         # Finishing up (outside the 'with' statement)
         if self.verbose:
@@ -1143,6 +1161,14 @@ class ObjectCollection:
                 handles_to_skip = set()
             # faster upload of data to MySQL server, only implemented for spectral data
             uploader = UploadSQL()
+            if SPECTRA_STORAGE_LAYOUT in consolidated_spectra_tables.keys():
+                consolidated_table_name = consolidated_spectra_tables[SPECTRA_STORAGE_LAYOUT]
+                if not load_sql.check_if_table_exists(table_name=consolidated_table_name, database=spectra_schema):
+                    load_sql.creat_table(table_name=consolidated_table_name, database=spectra_schema)
+            # the digests of the .npy files, the files of the live spectra are kept until the migration
+            if not load_sql.check_if_table_exists(table_name=spectrum_files_table, database=spectra_schema):
+                load_sql.creat_table(table_name=spectrum_files_table, database=spectra_schema)
+            live_file_digests = stored_spectrum_files(load_sql, database='spectra')
             percent_divider = len(self.available_spectrum_handles) / 100.0
             spectrum_count = 0
             for spexodisks_handle in sorted(self.available_spexodisks_handles):
@@ -1163,14 +1189,24 @@ class ObjectCollection:
                               f" data uploaded for spectra at {datetime.now()}, next spectra: {spectrum_handle}")
                     single_spectrum = single_star.__getattribute__(spectrum_handle)
                     # The Primary Spectrum
-                    uploader.upload_spectra(table_name=spectrum_handle.lower(),
-                                            wavelength_um=single_spectrum.wavelength_um,
-                                            flux=single_spectrum.flux,
-                                            flux_error=single_spectrum.flux_error,
-                                            bandwidth_fraction_for_null=bandwidth_fraction_for_null,
-                                            schema=spectra_schema)
+                    structured_array = uploader.upload_spectra(table_name=spectrum_handle.lower(),
+                                                               wavelength_um=single_spectrum.wavelength_um,
+                                                               flux=single_spectrum.flux,
+                                                               flux_error=single_spectrum.flux_error,
+                                                               bandwidth_fraction_for_null=bandwidth_fraction_for_null,
+                                                               schema=spectra_schema)
                     single_spectrum.write_txt(single_object=single_star, spectrum_handle=spectrum_handle)
                     single_spectrum.write_fits(single_object=single_star, spectrum_handle=spectrum_handle)
+                    # the same data as the SQL upload, memory mapped by the API, see science/db/spectrum_store.py
+                    spectrum_file_dir = os.path.dirname(single_spectrum.output_fits_filename)
+                    file_digest = write_spectrum_file(output_dir=spectrum_file_dir, spectrum_handle=spectrum_handle,
+                                                      structured_array=structured_array)
+                    load_sql.cursor.execute(f'REPLACE INTO {spectra_schema}.{spectrum_files_table} ' +
+                                            '(spectrum_handle, file_digest) VALUES (%s, %s)',
+                                            (spectrum_handle.lower(), file_digest))
+                    load_sql.connection.commit()
+                    prune_spectrum_files(output_dir=spectrum_file_dir, spectrum_handle=spectrum_handle,
+                                         keep_digests={file_digest, live_file_digests.get(spectrum_handle.lower())})
                     # Stacked Line Spectra
                     if single_spectrum.stacked_lines is not None:
                         for extra_science_product_path in single_spectrum.stacked_lines.keys():
@@ -1270,6 +1306,10 @@ class ObjectCollection:
                 if isotopologue.lower() in handles_to_skip:
                     if self.verbose:
                         print(F"Skipping {isotopologue} as it already exists in the database.")
+                    # tables from before the wavelength index was part of the schema
+                    load_sql.add_index_if_missing(table_name=f'isotopologue_{isotopologue.lower()}',
+                                                  column_name='wavelength_um', key_name=wavelength_index_name,
+                                                  database='spexodisks')
                     continue
                 # insert the per isotopologue Hitran line data
                 table_name = f'isotopologue_{isotopologue.lower()}'
@@ -1313,6 +1353,9 @@ class ObjectCollection:
         self.write_spectra()
         self.write_hitran()
         set_data_status_mysql(new_data_staged_to_set=True, new_data_commited_to_set=False, updated_mysql_to_set=False)
+        # the API serves the staged (new_) tables when API_USE_NEW_TABLES is set, so this is a new generation
+        set_data_generation_mysql()
+        write_manifest_mysql()
 
     def calculate_summary(self):
         self.summary = Summary()
@@ -4,7 +4,9 @@ import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 
-from science.db.sql import MYSQL_HOST, sql_port, sql_database, MYSQL_USER,  MYSQL_PASSWORD
+from science.db.sql import MYSQL_HOST, sql_port, sql_database, MYSQL_USER,  MYSQL_PASSWORD, SPECTRA_STORAGE_LAYOUT
+from science.db.sql_tables import consolidated_spectra_tables
+from science.db.spectrum_store import pack_spectrum_blob
 
 
 uri_base = f"mysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{sql_port}/"
@@ -45,6 +47,13 @@ def format_spectrum(wavelength_um: List[float], flux: List[float], flux_error: O
     # replacement here to save memory in the function call
     wavelength_um, flux, flux_error = zip(*remove_bad_nums(wavelength_um, flux, flux_error))
     wavelength_um = np.array(wavelength_um)
+    # the wavelength is the key of a spectrum's points in every storage layout, keep the first of any duplicates
+    _unique_wavelength_um, first_indexes = np.unique(wavelength_um, return_index=True)
+    is_first = np.zeros(len(wavelength_um), dtype=bool)
+    is_first[first_indexes] = True
+    wavelength_um = wavelength_um[is_first]
+    flux = np.array(flux)[is_first]
+    flux_error = np.array(flux_error)[is_first]
     spectrum_bandwidth_um = max(wavelength_um) - min(wavelength_um)
     bandwidth_for_null_um = spectrum_bandwidth_um * bandwidth_fraction_for_null
     # remove singletons, points isolated in wavelength from both neighbors by more than bandwidth_for_null_um
@@ -79,8 +88,37 @@ class UploadSQL:
 
     def upload_spectra(self, table_name: str, wavelength_um: List[float], flux: List[float],
                        flux_error: Optional[List[float]] = None, schema: str = sql_database,
-                       bandwidth_fraction_for_null: float = bandwidth_fraction_for_null_default):
+                       bandwidth_fraction_for_null: float = bandwidth_fraction_for_null_default,
+                       layout: str = SPECTRA_STORAGE_LAYOUT):
+        """
+        Upload a spectrum with a storage layout from science/db/spectrum_store.py, for the consolidated layouts
+        table_name is the spectrum handle and the consolidated table must exist in the schema.
+        Returns the uploaded spectrum, the structured array from format_spectrum().
+        """
         structured_array = format_spectrum(wavelength_um=wavelength_um, flux=flux, flux_error=flux_error,
                                            bandwidth_fraction_for_null=bandwidth_fraction_for_null)
-        df = pd.DataFrame(structured_array)
-        self.upload_table(table_name=table_name, df=df, schema=schema)
+        if layout == 'tables':
+            df = pd.DataFrame(structured_array)
+            self.upload_table(table_name=table_name, df=df, schema=schema)
+        elif layout == 'single_table':
+            # format_spectrum() removed any duplicate wavelengths, which are in the primary key
+            df = pd.DataFrame(structured_array)
+            df.insert(0, 'spectrum_handle', table_name)
+            # replace any earlier upload of the spectrum, as the other layouts do, so a re-run or resumed upload
+            # does not collide with the primary key
+            with self.engine.begin() as connection:
+                connection.execute(sa.text(f"DELETE FROM {schema}.{consolidated_spectra_tables[layout]} " +
+                                           "WHERE spectrum_handle = :spectrum_handle"),
+                                   {'spectrum_handle': table_name})
+                df.to_sql(consolidated_spectra_tables[layout], con=connection, schema=schema, if_exists='append',
+                          index=False, chunksize=10000)
+        elif layout == 'blob':
+            with self.engine.begin() as connection:
+                connection.execute(sa.text(f"REPLACE INTO {schema}.{consolidated_spectra_tables[layout]} " +
+                                           "(spectrum_handle, num_points, data) VALUES (:spectrum_handle, "
+                                           ":num_points, :data)"),
+                                   {'spectrum_handle': table_name, 'num_points': len(structured_array),
+                                    'data': pack_spectrum_blob(structured_array)})
+        else:
+            raise ValueError(f'Unknown spectra storage layout: {layout}')
+        return structured_array
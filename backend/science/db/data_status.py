@@ -1,11 +1,18 @@
+import os
+from datetime import datetime, timezone
+
 from mysql.connector.errors import ProgrammingError
 
-from science.db.sql import LoadSQL
+from science.db.sql import LoadSQL, API_SNAPSHOT_DIR
 
 
 database = 'data_status'
 table_name = 'status'
 query_str = f'SELECT new_data_staged, new_data_commited, updated_mysql FROM {database}.{table_name}'
+# the data generation increases each time the data served by the API changes, it keys the API caches
+generation_table_name = 'generation'
+generation_query_str = f'SELECT generation, migrated_at FROM {database}.{generation_table_name} ' + \
+                       'ORDER BY generation DESC LIMIT 1'
 
 
 def set_data_status_mysql(new_data_staged_to_set: bool = False,
@@ -13,7 +20,8 @@ def set_data_status_mysql(new_data_staged_to_set: bool = False,
                           updated_mysql_to_set: bool = False):
     # upload the data status to the MySQL database
     with LoadSQL(auto_connect=True, verbose=True) as output_sql:
-        output_sql.clear_database(database=database)
+        # only the status table is replaced, the generation table is kept
+        output_sql.create_schema(schema_name=database)
         output_sql.creat_table(table_name=table_name, database=database)
         output_sql.insert_into_table(table_name=table_name, database=database,
                                      data={'new_data_staged': new_data_staged_to_set,
@@ -38,3 +46,39 @@ def get_data_status_mysql() -> tuple[bool, bool, bool]:
         new_data_commited = bool(new_data_commited_int)
         updated_mysql = bool(updated_mysql_int)
     return new_data_staged, new_data_commited, updated_mysql
+
+
+def set_data_generation_mysql() -> int:
+    # start a new data generation, this is called when the tables that the API serves have changed
+    with LoadSQL(auto_connect=True, verbose=True) as output_sql:
+        output_sql.create_schema(schema_name=database)
+        if not output_sql.check_if_table_exists(table_name=generation_table_name, database=database):
+            output_sql.creat_table(table_name=generation_table_name, database=database)
+        output_sql.insert_into_table(table_name=generation_table_name, database=database,
+                                     data={'migrated_at': datetime.now(timezone.utc).replace(tzinfo=None)})
+        generation, _migrated_at = output_sql.query(sql_query_str=generation_query_str)[0]
+    retire_api_snapshots()
+    return generation
+
+
+def retire_api_snapshots():
+    # nginx serves the static API endpoints from the snapshots that the 'current' link points to
+    # (djangoAPI/snapshots.py), remove it so that nginx asks Django until the API renders the new generation
+    try:
+        os.remove(os.path.join(API_SNAPSHOT_DIR, 'current'))
+    except FileNotFoundError:
+        pass
+
+
+def get_data_generation_mysql() -> tuple[int, datetime]:
+    # the most recent data generation and the (UTC) time that it started
+    with LoadSQL(auto_connect=True, verbose=False) as output_sql:
+        try:
+            generation_mysql = output_sql.query(sql_query_str=generation_query_str)
+        except ProgrammingError:
+            generation_mysql = []
+    if not generation_mysql:
+        # no generation has been recorded yet
+        return 0, datetime(1970, 1, 1, tzinfo=timezone.utc)
+    generation, migrated_at = generation_mysql[0]
+    return generation, migrated_at.replace(tzinfo=timezone.utc)
@@ -0,0 +1,138 @@
+"""
+The manifest of the tables that the API serves: the spectrum handles and isotopologues with the database
+(schema) that holds each table, and the displayed parameters with their units.
+
+Finding these takes several information_schema queries, so the manifest is found once when the data changes,
+at staging and at migration, and stored as JSON in a single row of data_status.manifest per schema prefix.
+The API reads it with one query, see djangoAPI/dynamic_data.py.
+"""
+import json
+from datetime import datetime, timezone
+
+from mysql.connector.errors import ProgrammingError
+
+from science.db.sql import LoadSQL, SPECTRA_STORAGE_LAYOUT
+from science.db.data_status import database, get_data_generation_mysql
+from science.db.spectrum_store import stored_spectrum_handles, stored_spectrum_files
+
+# increase this when the structure of the manifest changes, older manifests are then ignored
+manifest_version = 3
+manifest_table_name = 'manifest'
+schema_prefixes = ('', 'new_')
+
+
+def package_iso_data(iso_data: list) -> dict:
+    iso_dict = {}
+    for a_molecule, a_isotopologue in iso_data:
+        if a_molecule not in iso_dict.keys():
+            iso_dict[a_molecule] = set()
+        iso_dict[a_molecule].add(a_isotopologue)
+    return iso_dict
+
+
+def discover_manifest(schema_prefix: str) -> dict:
+    """
+    Find the manifest from the metadata tables and information_schema.
+    With the 'new_' prefix, tables not found in the new_ schemas are served from the live schemas.
+    The spectra are found with the storage layout of SPECTRA_STORAGE_LAYOUT, see science/db/spectrum_store.py,
+    with the digest of each spectrum's .npy file from the same schema as the spectrum.
+    """
+    schema_name = f'{schema_prefix}spexodisks'
+    with LoadSQL(verbose=False) as load_sql:
+        available_isotopologues_raw = load_sql.query(
+            sql_query_str=f'SELECT molecule, name FROM {schema_name}.available_isotopologues')
+        available_isotopologues = package_iso_data(iso_data=available_isotopologues_raw)
+        available_spectra_raw = load_sql.query(
+            sql_query_str=f'SELECT spectrum_handle FROM {schema_name}.spectra')
+        available_spectra_handles = {spectrum_data[0] for spectrum_data in available_spectra_raw}
+        available_params_raw = load_sql.query(
+            sql_query_str=f'SELECT param_handle, units FROM {schema_name}.available_params_and_units ' +
+                          'WHERE for_display = 1')
+        available_params_and_units = [[param_data[0], param_data[1]] for param_data in available_params_raw]
+        # map the handles to the correct database
+        if schema_prefix:
+            available_new_spectra_tables = stored_spectrum_handles(load_sql, database='new_spectra')
+            available_new_spexodisks_tables = set(load_sql.get_all_tables(database='new_spexodisks'))
+            new_spectrum_file_digests = stored_spectrum_files(load_sql, database='new_spectra')
+        else:
+            available_new_spectra_tables = set()
+            available_new_spexodisks_tables = set()
+            new_spectrum_file_digests = {}
+        available_live_spectra_handles = stored_spectrum_handles(load_sql, database='spectra')
+        spectrum_file_digests_by_database = {'new_spectra': new_spectrum_file_digests,
+                                             'spectra': stored_spectrum_files(load_sql, database='spectra')}
+        available_live_iso_handles = {table_name for table_name in load_sql.get_all_tables(database='spexodisks')
+                                      if table_name.startswith('isotopologue')}
+    # mapping for spectra
+    available_spectra_to_database = {}
+    for available_spectra_handle in sorted(available_spectra_handles):
+        if available_spectra_handle in available_new_spectra_tables:
+            available_spectra_to_database[available_spectra_handle] = 'new_spectra'
+        elif available_spectra_handle in available_live_spectra_handles:
+            available_spectra_to_database[available_spectra_handle] = 'spectra'
+        else:
+            raise KeyError(f'Could not find the database for the spectrum handle: {available_spectra_handle}')
+    # the .npy file of each spectrum that has one, the API only reads a file with this digest
+    spectrum_file_digests = {}
+    for available_spectra_handle, spectra_database in available_spectra_to_database.items():
+        file_digest = spectrum_file_digests_by_database[spectra_database].get(available_spectra_handle.lower())
+        if file_digest is not None:
+            spectrum_file_digests[available_spectra_handle] = file_digest
+    # mapping for isotopologues
+    available_isotopologues_to_database = {molecule: {} for molecule in sorted(available_isotopologues.keys())}
+    for molecule in available_isotopologues.keys():
+        for isotopologue in sorted(available_isotopologues[molecule]):
+            if f'isotopologue_{isotopologue}' in available_new_spexodisks_tables:
+                available_isotopologues_to_database[molecule][isotopologue] = 'new_spexodisks'
+            elif f'isotopologue_{isotopologue}' in available_live_iso_handles:
+                available_isotopologues_to_database[molecule][isotopologue] = 'spexodisks'
+            else:
+                raise KeyError(f'Could not find the database for the isotopologue: {isotopologue}')
+    return {'version': manifest_version,
+            'schema_prefix': schema_prefix,
+            'spectra_layout': SPECTRA_STORAGE_LAYOUT,
+            'spectra': available_spectra_to_database,
+            'spectrum_files': spectrum_file_digests,
+            'isotopologues': available_isotopologues_to_database,
+            'params_and_units': available_params_and_units}
+
+
+def write_manifest_mysql():
+    """
+    Store the manifest for each schema prefix, this is called after staging and after migration.
+    A schema prefix without the metadata tables (for example, nothing staged yet) is skipped.
+    """
+    generation, _migrated_at = get_data_generation_mysql()
+    manifests = {}
+    for schema_prefix in schema_prefixes:
+        try:
+            manifests[schema_prefix] = discover_manifest(schema_prefix=schema_prefix)
+        except (ProgrammingError, KeyError) as error:
+            print(f'  No manifest for the schema prefix "{schema_prefix}": {error}')
+    with LoadSQL(auto_connect=True, verbose=True) as output_sql:
+        output_sql.create_schema(schema_name=database)
+        if not output_sql.check_if_table_exists(table_name=manifest_table_name, database=database):
+            output_sql.creat_table(table_name=manifest_table_name, database=database)
+        output_sql.cursor.execute(f'DELETE FROM {database}.{manifest_table_name}')
+        for schema_prefix, manifest in manifests.items():
+            output_sql.cursor.execute(
+                f'INSERT INTO {database}.{manifest_table_name} ' +
+                '(schema_prefix, manifest_version, generation, created_at, manifest) VALUES (%s, %s, %s, %s, %s)',
+                (schema_prefix, manifest_version, generation, datetime.now(timezone.utc).replace(tzinfo=None),
+                 json.dumps(manifest, separators=(',', ':'))))
+        output_sql.connection.commit()
+
+
+def get_manifest_mysql(schema_prefix: str) -> dict | None:
+    # the stored manifest, None if there is no manifest of the current version for this schema prefix
+    with LoadSQL(auto_connect=True, verbose=False) as load_sql:
+        try:
+            load_sql.cursor.execute(f'SELECT manifest FROM {database}.{manifest_table_name} ' +
+                                    'WHERE schema_prefix = %s AND manifest_version = %s',
+                                    (schema_prefix, manifest_version))
+            manifest_mysql = load_sql.cursor.fetchall()
+        except ProgrammingError:
+            manifest_mysql = []
+    if not manifest_mysql:
+        return None
+    return json.loads(manifest_mysql[0][0])
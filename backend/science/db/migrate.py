@@ -1,5 +1,6 @@
 from science.analyze.prescriptions import update_schemas
-from science.db.data_status import set_data_status_mysql
+from science.db.data_status import set_data_status_mysql, set_data_generation_mysql
+from science.db.manifest import write_manifest_mysql
 
 
 def do_migration():
@@ -7,6 +8,10 @@ def do_migration():
     update_schemas(delete_spectra_tables=False)
     # update the states in the MySQL service
     set_data_status_mysql(new_data_staged_to_set=False, new_data_commited_to_set=False, updated_mysql_to_set=True)
+    # a new generation of data, this invalidates the API caches
+    set_data_generation_mysql()
+    # the tables served by the API have moved
+    write_manifest_mysql()
 
 
 if __name__ == '__main__':
@@ -2,14 +2,17 @@ import os
 import pathlib
 import shutil
 import zipfile
+import hashlib
 import datetime
-from io import BytesIO
-from typing import NamedTuple, Union
+import tempfile
+from threading import Lock
+from typing import NamedTuple, Iterator
 
 import mysql.connector
 from spexod.filepaths import fitsfile_py_path, fitsfile_md_path
 
-from science.db.sql import django_tables, LoadSQL
+from science.db.sql import django_tables, LoadSQL, DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MAX_MB
+from science.db.spectrum_store import parse_spectrum_file_name
 from ref.ref import data_pro_dir, today_str
 from science.analyze.prescriptions import standard, sql_update
 
@@ -20,9 +23,31 @@ class OutputDatum(NamedTuple):
     output_path: str
 
 
+class ZipStreamBuffer:
+    """
+    A write-only, unseekable file for zipfile.ZipFile, the written bytes are collected until they are popped.
+    zipfile writes data descriptors after each member when the output is unseekable, so nothing is rewritten.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
 class Dispatch:
     output_dir_default = os.path.join(os.getcwd(), 'output')
     allowed_extensions = {'txt', 'fits'}
+    zip_chunk_size = 2 ** 16
 
     def __init__(self, verbose=False, output_dir=None):
         self.verbose = verbose
@@ -33,6 +58,10 @@ class Dispatch:
         if not os.path.exists(self.output_dir):
             os.mkdir(self.output_dir)
         self.output_datum_by_spectrum_handle = None
+        # the .npy spectrum files that the API reads by (spectrum handle, digest), these are not part of the downloads
+        self.spectrum_file_by_handle_and_digest = None
+        # one refresh at a time, so that the last refresh started is the last swapped in
+        self.refresh_lock = Lock()
         self.refresh()
         if verbose:
             if self.output_datum_by_spectrum_handle is None:
@@ -42,24 +71,37 @@ class Dispatch:
             print(f'Output directory: {self.output_dir}')
 
     def refresh(self):
-        self.output_datum_by_spectrum_handle = {}
+        # the indexes are swapped in when complete, the API reads them while a refresh runs in another thread
+        with self.refresh_lock:
+            self.index_output_dir()
+
+    def index_output_dir(self):
+        output_datum_by_spectrum_handle = {}
+        spectrum_file_by_handle_and_digest = {}
         for file_or_dir in os.listdir(self.output_dir):
             starname_dir = os.path.join(self.output_dir, file_or_dir)
             if file_or_dir[0] != '!' and os.path.isdir(starname_dir):
                 starname = file_or_dir
                 for output_file in os.listdir(starname_dir):
+                    output_path = os.path.join(starname_dir, output_file)
+                    handle_and_digest = parse_spectrum_file_name(output_file)
+                    if handle_and_digest is not None:
+                        if os.path.isfile(output_path):
+                            spectrum_file_by_handle_and_digest[handle_and_digest] = output_path
+                        continue
                     try:
                         spectrum_handle, extension = output_file.rsplit('.', 1)
                     except ValueError:
                         continue
                     if extension.lower() in self.allowed_extensions:
-                        output_path = os.path.join(starname_dir, output_file)
                         if os.path.isfile(output_path):
                             output_datum = OutputDatum(spectrum_handle=spectrum_handle, starname=starname,
                                                        output_path=output_path)
-                            if spectrum_handle not in self.output_datum_by_spectrum_handle.keys():
-                                self.output_datum_by_spectrum_handle[spectrum_handle] = []
-                            self.output_datum_by_spectrum_handle[spectrum_handle].append(output_datum)
+                            if spectrum_handle not in output_datum_by_spectrum_handle.keys():
+                                output_datum_by_spectrum_handle[spectrum_handle] = []
+                            output_datum_by_spectrum_handle[spectrum_handle].append(output_datum)
+        self.output_datum_by_spectrum_handle = output_datum_by_spectrum_handle
+        self.spectrum_file_by_handle_and_digest = spectrum_file_by_handle_and_digest
 
     def write_upload_files(self):
         if os.path.exists(self.output_dir):
@@ -72,26 +114,126 @@ class Dispatch:
     def write_sql():
         sql_update(upload_sql=True, write_plots=False, target_file=None)
 
-    def zip_upload(self, spectra_handles: list) -> bytes:
-        failed_requests = []
-        file_count = 0
-        mem_zip = BytesIO()
-        with zipfile.ZipFile(mem_zip, mode="w",) as zip_ref:
-            # This python file is packaged with the FITS files so that users have a hope of reading them
-            zip_ref.write(fitsfile_py_path, arcname=os.path.basename(fitsfile_py_path))
-            # The markdown file is packaged with the FITS files so that users have a hope of reading them
-            zip_ref.write(fitsfile_md_path, arcname=os.path.basename(fitsfile_md_path))
-            for spectra_handle in spectra_handles:
-                if spectra_handle in self.output_datum_by_spectrum_handle.keys():
-                    spectrum_data = self.output_datum_by_spectrum_handle[spectra_handle]
-                    for spectrum_datum in spectrum_data:
-                        arcname = os.path.join(f'{spectrum_datum.starname}',
-                                               os.path.basename(spectrum_datum.output_path))
-                        zip_ref.write(spectrum_datum.output_path, arcname=arcname)
-                        file_count += 1
-                else:
-                    failed_requests.append(spectra_handle)
-        return mem_zip.getvalue()
+    def zip_members(self, spectra_handles: list) -> list[tuple[str, str]]:
+        # (file path, path in the archive) for each file in the archive, unknown spectrum handles are skipped
+        # The python and markdown files are packaged with the FITS files so that users have a hope of reading them
+        members = [(fitsfile_py_path, os.path.basename(fitsfile_py_path)),
+                   (fitsfile_md_path, os.path.basename(fitsfile_md_path))]
+        for spectra_handle in spectra_handles:
+            if spectra_handle in self.output_datum_by_spectrum_handle.keys():
+                for spectrum_datum in self.output_datum_by_spectrum_handle[spectra_handle]:
+                    arcname = os.path.join(f'{spectrum_datum.starname}', os.path.basename(spectrum_datum.output_path))
+                    members.append((spectrum_datum.output_path, arcname))
+        return members
+
+    def zip_stream(self, spectra_handles: list) -> Iterator[bytes]:
+        """
+        The zip archive of the requested spectra as a stream of bytes, each file is read and compressed in
+        chunks of zip_chunk_size, so the memory used does not depend on the size of the archive.
+        """
+        buffer = ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, mode='w') as zip_ref:
+            for file_path, arcname in self.zip_members(spectra_handles=spectra_handles):
+                zip_info = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+                zip_info.compress_type = zipfile.ZIP_DEFLATED
+                with open(file_path, 'rb') as source, zip_ref.open(zip_info, mode='w') as destination:
+                    for chunk in iter(lambda: source.read(self.zip_chunk_size), b''):
+                        destination.write(chunk)
+                        data = buffer.pop()
+                        if data:
+                            yield data
+                # the rest of the member and its data descriptor
+                data = buffer.pop()
+                if data:
+                    yield data
+        # the central directory, written when the archive is closed
+        data = buffer.pop()
+        if data:
+            yield data
+
+
+class DownloadCache:
+    """
+    Zip archives of previous downloads, content addressed by the requested spectrum handles and the data generation.
+
+    An archive is written to a temporary file while it is streamed to the first user, and is renamed into place
+    only when it is complete. The total size of the archives is bounded, the least recently used archives
+    (oldest modification time, which is updated on each hit) are deleted first.
+    """
+    temp_prefix = 'partial_'
+    # temporary files older than this are from interrupted downloads
+    temp_max_age_seconds = 60 * 60
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        if cache_dir is None:
+            self.cache_dir = DOWNLOAD_CACHE_DIR
+        else:
+            self.cache_dir = cache_dir
+        if max_bytes is None:
+            self.max_bytes = DOWNLOAD_CACHE_MAX_MB * 2 ** 20
+        else:
+            self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(spectra_handles: list, generation: int) -> str:
+        key_str = f"{generation}|{'%'.join(sorted(set(spectra_handles)))}"
+        return hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.zip')
+
+    def get(self, key: str) -> str | None:
+        # the path to the archive, or None if it is not cached
+        archive_path = self.path(key)
+        try:
+            # mark as recently used
+            os.utime(archive_path)
+        except FileNotFoundError:
+            return None
+        return archive_path
+
+    def write_stream(self, key: str, stream: Iterator[bytes]) -> Iterator[bytes]:
+        """
+        Pass the stream through, while writing it to the cache. Nothing is cached if the stream is not
+        read to the end, for example when the user cancels the download.
+        """
+        temp_fd, temp_path = tempfile.mkstemp(prefix=self.temp_prefix, suffix='.zip', dir=self.cache_dir)
+        try:
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                for chunk in stream:
+                    temp_file.write(chunk)
+                    yield chunk
+            os.replace(temp_path, self.path(key))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict()
+
+    def evict(self):
+        # delete the least recently used archives until the cache fits in max_bytes
+        now = datetime.datetime.now().timestamp()
+        archives = []
+        for file_name in os.listdir(self.cache_dir):
+            file_path = os.path.join(self.cache_dir, file_name)
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if file_name.startswith(self.temp_prefix):
+                if now - file_stat.st_mtime > self.temp_max_age_seconds:
+                    os.remove(file_path)
+            elif file_name.endswith('.zip'):
+                archives.append((file_stat.st_mtime, file_stat.st_size, file_path))
+        total_bytes = sum(size for _mtime, size, _file_path in archives)
+        for _mtime, size, file_path in sorted(archives):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
 
 
 def write_upload_files():
@@ -0,0 +1,125 @@
+"""
+The storage layouts of the spectra in the spectra schemas, chosen with SPECTRA_STORAGE_LAYOUT (science/db/sql.py):
+
+    tables          one table per spectrum handle, (wavelength_um, flux, flux_error), the original layout
+    single_table    all the spectra in one table, spectrum_points, with the primary key (spectrum_handle, wavelength_um)
+    blob            one row per spectrum in spectrum_blobs, the spectrum's columns packed into one compressed blob
+
+The consolidated layouts keep the number of tables in the spectra schemas constant, instead of one table (and its
+files and dictionary entries in MySQL) per spectrum. The pipeline writes with the configured layout and records it in
+the manifest (science/db/manifest.py), so the API reads each generation with the layout it was written with.
+Changing the layout needs a full upload (DATA_NEW_UPLOADS_ONLY=false) and migration with delete_spectra_tables=True.
+
+Independently of the layout, the pipeline also writes each spectrum as a .npy file of the same structured array
+next to its FITS and txt files. The files are written at staging, before the migration, so each file is named with
+a digest of its content, <spectrum_handle>.<digest>.npy, and the digest is stored in the spectrum_files table of
+the spectra schema that the spectrum is written to. The table is migrated with the spectra, and the manifest
+records the digest of each spectrum from the schema it is served from. The API memory maps a file only when its
+digest is the one in the manifest (djangoAPI/tables.py), otherwise the spectrum is read from MySQL.
+"""
+import os
+import zlib
+import hashlib
+from io import BytesIO
+
+import numpy as np
+
+from science.db.sql import SPECTRA_STORAGE_LAYOUT
+from science.db.sql_tables import consolidated_spectra_tables, consolidated_spectra_columns, spectrum_files_table
+
+storage_layouts = ('tables', 'single_table', 'blob')
+if SPECTRA_STORAGE_LAYOUT not in storage_layouts:
+    raise ValueError(f'SPECTRA_STORAGE_LAYOUT must be one of {", ".join(storage_layouts)}, '
+                     f'got: {SPECTRA_STORAGE_LAYOUT}')
+
+# the blob is the wavelength, flux, and flux error columns one after the other, wavelength_um stays
+# a float64 like the DOUBLE column of the other layouts, the gaps between segments are NaN flux values,
+# the .npy files are a structured array of the same columns
+blob_dtypes = (('wavelength_um', '<f8'), ('flux', '<f4'), ('flux_error', '<f4'))
+blob_compress_level = 6
+# the extension of the spectrum files, these are indexed by science.db.sandbox.Dispatch
+spectrum_file_extension = 'npy'
+# the length of the hex digest in the spectrum file names, the file_digest column of spectrum_files
+spectrum_file_digest_len = 16
+
+
+def pack_spectrum_blob(structured_array: np.ndarray) -> bytes:
+    """ The blob for a spectrum from science.db.alchemy.format_spectrum(). """
+    return zlib.compress(b''.join(np.ascontiguousarray(structured_array[column_name], dtype=dtype).tobytes()
+                                  for column_name, dtype in blob_dtypes), blob_compress_level)
+
+
+def unpack_spectrum_blob(data: bytes, num_points: int) -> dict[str, np.ndarray]:
+    """ The column arrays of a spectrum's blob, in wavelength order. """
+    raw = zlib.decompress(data)
+    columns = {}
+    offset = 0
+    for column_name, dtype in blob_dtypes:
+        columns[column_name] = np.frombuffer(raw, dtype=dtype, count=num_points, offset=offset)
+        offset += columns[column_name].nbytes
+    return columns
+
+
+def spectrum_file_name(spectrum_handle: str, digest: str) -> str:
+    return f'{spectrum_handle.lower()}.{digest}.{spectrum_file_extension}'
+
+
+def parse_spectrum_file_name(file_name: str) -> tuple[str, str] | None:
+    """ The (spectrum handle, digest) of a spectrum file name, None for other files. """
+    try:
+        spectrum_handle, digest, extension = file_name.rsplit('.', 2)
+    except ValueError:
+        return None
+    if extension != spectrum_file_extension or len(digest) != spectrum_file_digest_len:
+        return None
+    return spectrum_handle, digest
+
+
+def write_spectrum_file(output_dir: str, spectrum_handle: str, structured_array: np.ndarray) -> str:
+    """
+    Write a spectrum from science.db.alchemy.format_spectrum() as a little-endian .npy file in output_dir and return
+    the digest in its name. A file is never changed once written, so a reader that maps a file always sees
+    the spectrum that the file's digest was recorded for.
+    """
+    spectrum = np.empty(len(structured_array), dtype=list(blob_dtypes))
+    for column_name, _dtype in blob_dtypes:
+        spectrum[column_name] = structured_array[column_name]
+    buffer = BytesIO()
+    np.save(buffer, spectrum, allow_pickle=False)
+    digest = hashlib.sha256(buffer.getbuffer()).hexdigest()[:spectrum_file_digest_len]
+    path = os.path.join(output_dir, spectrum_file_name(spectrum_handle, digest))
+    if not os.path.exists(path):
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp_path, path)
+    return digest
+
+
+def prune_spectrum_files(output_dir: str, spectrum_handle: str, keep_digests: set[str]):
+    """ Remove the files of a spectrum in output_dir other than those with keep_digests, the live and staged files. """
+    for file_name in os.listdir(output_dir):
+        parsed = parse_spectrum_file_name(file_name)
+        if parsed is not None and parsed[0] == spectrum_handle.lower() and parsed[1] not in keep_digests:
+            os.remove(os.path.join(output_dir, file_name))
+
+
+def stored_spectrum_files(load_sql, database: str) -> dict[str, str]:
+    """ The file digest of each spectrum handle in a spectra schema, load_sql is an open science.db.sql.LoadSQL. """
+    if not load_sql.check_if_table_exists(table_name=spectrum_files_table, database=database):
+        return {}
+    return {spectrum_handle: file_digest for spectrum_handle, file_digest in load_sql.query(
+        sql_query_str=f'SELECT spectrum_handle, file_digest FROM {database}.{spectrum_files_table}')}
+
+
+def stored_spectrum_handles(load_sql, database: str, layout: str = SPECTRA_STORAGE_LAYOUT) -> set[str]:
+    """ The spectrum handles stored in a spectra schema, load_sql is an open science.db.sql.LoadSQL. """
+    if layout == 'tables':
+        # the other tables of the schema hold rows per spectrum handle, they are not spectra
+        return set(load_sql.get_all_tables(database=database)) - set(consolidated_spectra_columns.keys())
+    table_name = consolidated_spectra_tables[layout]
+    if not load_sql.check_if_table_exists(table_name=table_name, database=database):
+        return set()
+    # the handle is the first column of the primary key, so this reads the index, not the spectra
+    return {row[0] for row in load_sql.query(
+        sql_query_str=f'SELECT spectrum_handle FROM {database}.{table_name} GROUP BY spectrum_handle')}
@@ -11,7 +11,8 @@ from numpy import float32, float64
 
 from science.db.sql_tables import (name_specs, param_ref, max_star_name_size, double_param, double_param_error,
                                    str_param, str_param_error, update_schema_map, create_tables,
-                                   dynamically_named_tables)
+                                   dynamically_named_tables, max_curated_indexes, consolidated_spectra_tables,
+                                   consolidated_spectra_columns)
 
 
 def str_is_true(s: str) -> bool:
@@ -64,9 +65,15 @@ MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "password")
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "/home/ubuntu/SpExServer/backend/output")
 update_mode = str_is_true(os.environ.get("DATA_NEW_UPLOADS_ONLY", "true"))
 API_USE_NEW_TABLES = str_is_true(os.environ.get("API_USE_NEW_TABLES", 'true'))
+# how the pipeline writes the spectra: tables, single_table, or blob, see science/db/spectrum_store.py
+SPECTRA_STORAGE_LAYOUT = os.environ.get("SPECTRA_STORAGE_LAYOUT", "tables")
 DEBUG = str_is_true(os.environ.get("DEBUG", "true"))
 DATA_MIGRATE_FROM_STAGED = str_is_true(os.environ.get("DATA_MIGRATE_FROM_STAGED", 'false'))
 print(f'DATA_MIGRATE_FROM_STAGED: {DATA_MIGRATE_FROM_STAGED}')
+DOWNLOAD_CACHE_DIR = os.environ.get("DOWNLOAD_CACHE_DIR", "/var/tmp/spexodisks_downloads")
+DOWNLOAD_CACHE_MAX_MB = int(os.environ.get("DOWNLOAD_CACHE_MAX_MB", "2048"))
+# the API's pre-rendered snapshots for nginx, see djangoAPI/snapshots.py, a new data generation retires them
+API_SNAPSHOT_DIR = os.environ.get("API_SNAPSHOT_DIR", "/var/tmp/spexodisks_api_snapshots")
 EMAIL_HOST = os.environ.get("DJANGO_EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = os.environ.get("DJANGO_EMAIL_PORT", "587")
 EMAIL_USER = str_or_none(os.environ.get("DJANGO_EMAIL_USER", "None"))
@@ -281,6 +288,16 @@ class OutputSQL:
         self.cursor.execute(F"SHOW KEYS FROM {database}.{table_name} WHERE Key_name = '{key_name}';")
         return bool(self.cursor.fetchone())
 
+    def add_index_if_missing(self, table_name, column_name, key_name, database=None):
+        if database is None:
+            database = sql_database
+        self.open_if_closed()
+        if not self.check_key_exists(table_name=table_name, key_name=key_name, database=database):
+            if self.verbose:
+                print(f"  Adding the index '{key_name}' on {database}.{table_name}({column_name})")
+            self.cursor.execute(F"ALTER TABLE {database}.{table_name} ADD INDEX `{key_name}` (`{column_name}`);")
+            self.connection.commit()
+
     def get_matching_data(self, column_name: str, match_value: str, table_name: str, database: str = None):
         if database is None:
             database = sql_database
@@ -557,6 +574,15 @@ class LoadSQL(OutputSQL):
             all_column_names.extend(str_column_names)
             for column_name, spec in zip(str_column_names, str_specs):
                 create_str += F"`{column_name}` {spec}"
+        # index the columns that the API can filter on, see djangoAPI/filters.py
+        index_columns = ['has_spectra'] + [F"{param}_value" for param in float_params]
+        if len(index_columns) > max_curated_indexes:
+            warn(f'Only the first {max_curated_indexes} of {len(index_columns)} filterable columns ' +
+                 'of the curated table are indexed.')
+        for column_name in index_columns[:max_curated_indexes]:
+            # MySQL identifiers are at most 64 characters
+            index_name = F"ix_{column_name}"[:64]
+            create_str += F"KEY `{index_name}` (`{column_name}`), "
         create_str += "PRIMARY KEY (`spexodisks_handle`)" + ") ENGINE=InnoDB;"
         self.cursor.execute(create_str)
         self.connection.commit()
@@ -573,6 +599,20 @@ class LoadSQL(OutputSQL):
                 if table_name in django_tables_set:
                     # drop the temporary user data tables from new_spectra and do not move them
                     self.drop_if_exists(table_name=table_name, database=source)
+                elif table_name in consolidated_spectra_columns.keys() and \
+                        self.check_if_table_exists(table_name=table_name, database=target):
+                    # a consolidated spectra table holds many spectra (science/db/spectrum_store.py), the staged
+                    # spectra replace the live spectra with the same handles and the others are kept,
+                    # the same as with one table per spectrum
+                    self.cursor.execute(F"""DELETE FROM {target}.{table_name} WHERE spectrum_handle IN
+                                            (SELECT spectrum_handle FROM {source}.{table_name});""")
+                    columns_str = ', '.join(f'`{column}`' for column in consolidated_spectra_columns[table_name])
+                    self.cursor.execute(F"""INSERT INTO {target}.{table_name} ({columns_str})
+                                            SELECT {columns_str} FROM {source}.{table_name};""")
+                    self.drop_if_exists(table_name=table_name, database=source)
+                    if self.verbose:
+                        print(F"     Merged {source}.{table_name} into {target}.{table_name}")
+                    self.connection.commit()
                 else:
                     # drop the old database table
                     self.drop_if_exists(table_name=table_name, database=target)
@@ -9,9 +9,24 @@ max_notes_len = 100
 max_spectral_handle_len = 100
 max_output_filename_len = 225
 
+# secondary index on the wavelength of the isotopologue (Hitran line) tables, for wavelength window queries
+wavelength_index_name = 'ix_wavelength_um'
+# secondary indexes on the filterable numeric columns of the curated table, InnoDB allows at most 64 per table
+max_curated_indexes = 60
+
 # how the website updates the tables
 update_schema_map = [('spexodisks', 'new_spexodisks'), ('spectra', 'new_spectra'),
                      ('stacked_line_spectra', 'new_stacked_line')]
+# the table that holds all the spectra for the consolidated storage layouts, see science/db/spectrum_store.py
+consolidated_spectra_tables = {'single_table': 'spectrum_points', 'blob': 'spectrum_blobs'}
+# the content digest of each spectrum's .npy file, kept with the spectra so that the API only reads the files
+# of the spectra that it serves, see science/db/spectrum_store.py
+spectrum_files_table = 'spectrum_files'
+# the columns of the tables in the spectra schemas that hold a row (or rows) per spectrum handle,
+# as in create_tables below, these are merged by spectrum handle when the staged data are migrated
+consolidated_spectra_columns = {'spectrum_points': ('spectrum_handle', 'wavelength_um', 'flux', 'flux_error'),
+                                'spectrum_blobs': ('spectrum_handle', 'num_points', 'data'),
+                                spectrum_files_table: ('spectrum_handle', 'file_digest')}
 
 name_specs = F"VARCHAR({max_star_name_size}) NOT NULL, "
 param_name = F"VARCHAR({max_param_type_len}) NOT NULL, "
@@ -49,7 +64,8 @@ co_table_header = "(`index_CO` INT(11) NOT NULL AUTO_INCREMENT, " + \
                    "`branch` VARCHAR(1), " + \
                    "`lower_vibrational` INT(2), " + \
                    "`lower_rotational` INT(2), " + \
-                    "PRIMARY KEY (`index_CO`)" + \
+                    "PRIMARY KEY (`index_CO`), " + \
+                    "KEY `" + wavelength_index_name + "` (`wavelength_um`)" + \
                    ") ENGINE=InnoDB;"
 
 h20_table_header = "(`index_H2O` INT(11) NOT NULL AUTO_INCREMENT, " + \
@@ -75,7 +91,8 @@ h20_table_header = "(`index_H2O` INT(11) NOT NULL AUTO_INCREMENT, " + \
                     "`lower_rotational` INT(2), " + \
                     "`lower_ka` INT(2), " + \
                     "`lower_kc` INT(2), " + \
-                    "PRIMARY KEY (`index_H2O`)" + \
+                    "PRIMARY KEY (`index_H2O`), " + \
+                    "KEY `" + wavelength_index_name + "` (`wavelength_um`)" + \
                     ") ENGINE=InnoDB;"
 
 oh_table_header = '(`index_OH` INT(11) NOT NULL AUTO_INCREMENT, ' + \
@@ -100,11 +117,20 @@ oh_table_header = '(`index_OH` INT(11) NOT NULL AUTO_INCREMENT, ' + \
                   '`lower_sym_double_prime` VARCHAR(2), ' + \
                   '`lower_total_angular_momentum` VARCHAR(5), ' + \
                   '`lower_vibrational` INT(2), ' + \
-                  'PRIMARY KEY (`index_OH`)' + \
+                  'PRIMARY KEY (`index_OH`), ' + \
+                  'KEY `' + wavelength_index_name + '` (`wavelength_um`)' + \
                   ') ENGINE=InnoDB;'
 
 
-create_tables = {'object_name_aliases': "CREATE TABLE `object_name_aliases` ("
+create_tables = {'sky_index': "CREATE TABLE `sky_index` (" +
+                              "`spexodisks_handle` " + name_specs +
+                              "`ra_deg` DOUBLE NOT NULL, " +
+                              "`dec_deg` DOUBLE NOT NULL, " +
+                              "`bucket_id` INT(11) NOT NULL, " +
+                              "KEY `ix_bucket_id` (`bucket_id`), " +
+                              "PRIMARY KEY (`spexodisks_handle`)" +
+                              ") ENGINE=InnoDB;",
+                 'object_name_aliases': "CREATE TABLE `object_name_aliases` ("
                                         "`alias` " + name_specs +
                                         "`spexodisks_handle` " + name_specs +
                                         "PRIMARY KEY (`alias`)" +
@@ -243,6 +269,35 @@ create_tables = {'object_name_aliases': "CREATE TABLE `object_name_aliases` ("
                            "`new_data_commited` TINYINT , " +
                            "`updated_mysql` TINYINT , " +
                            "PRIMARY KEY (`index_status`) ) ENGINE=InnoDB;",
+                 "generation": "CREATE TABLE `generation` " +
+                               "(`generation` int(11) NOT NULL AUTO_INCREMENT, " +
+                               "`migrated_at` DATETIME NOT NULL, " +
+                               "PRIMARY KEY (`generation`) ) ENGINE=InnoDB;",
+                 "manifest": "CREATE TABLE `manifest` " +
+                             "(`schema_prefix` VARCHAR(10) NOT NULL, " +
+                             "`manifest_version` int(11) NOT NULL, " +
+                             "`generation` int(11) NOT NULL, " +
+                             "`created_at` DATETIME NOT NULL, " +
+                             "`manifest` LONGTEXT NOT NULL, " +
+                             "PRIMARY KEY (`schema_prefix`) ) ENGINE=InnoDB;",
+                 "spectrum_points": "CREATE TABLE `spectrum_points` (" +
+                                    "`spectrum_handle` " + spectrum_handle +
+                                    "`wavelength_um` " + double_param +
+                                    "`flux` " + float_param_error +
+                                    "`flux_error` " + float_param_error +
+                                    "PRIMARY KEY (`spectrum_handle`, `wavelength_um`)" +
+                                    ") ENGINE=InnoDB;",
+                 "spectrum_blobs": "CREATE TABLE `spectrum_blobs` (" +
+                                   "`spectrum_handle` " + spectrum_handle +
+                                   "`num_points` INT NOT NULL, " +
+                                   "`data` LONGBLOB NOT NULL, " +
+                                   "PRIMARY KEY (`spectrum_handle`)" +
+                                   ") ENGINE=InnoDB;",
+                 "spectrum_files": "CREATE TABLE `spectrum_files` (" +
+                                   "`spectrum_handle` " + spectrum_handle +
+                                   "`file_digest` CHAR(16) NOT NULL, " +
+                                   "PRIMARY KEY (`spectrum_handle`)" +
+                                   ") ENGINE=InnoDB;",
                  }
 
 dynamically_named_tables = {"spectrum": "(`wavelength_um` " + double_param +
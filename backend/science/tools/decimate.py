@@ -0,0 +1,59 @@
+"""
+Shape preserving decimation of spectra for plotting at screen resolution.
+
+Spectra written by science.db.alchemy.format_spectrum contain gap markers, rows where the flux is NULL (NaN),
+that split a spectrum into segments of contiguous data. The decimation keeps every gap marker and never
+mixes points from different segments in the same bin, so segments are never bridged in a plot.
+"""
+import numpy as np
+
+
+def segment_ids(flux: np.ndarray) -> np.ndarray:
+    # every gap marker (NaN flux) starts a new segment
+    return np.cumsum(np.isnan(flux))
+
+
+def min_max_indices(wavelength_um: np.ndarray, flux: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices, in wavelength order, of the minimum and maximum flux in each of max_points // 2 bins of equal
+    wavelength width, computed per segment, plus the indices of all the gap markers.
+
+    wavelength_um must be sorted. All the indices are returned when the spectrum is already small enough.
+    """
+    total_points = len(wavelength_um)
+    if total_points <= max_points:
+        return np.arange(total_points)
+    is_gap = np.isnan(flux)
+    gap_indices = np.flatnonzero(is_gap)
+    data_indices = np.flatnonzero(~is_gap)
+    if len(data_indices) == 0:
+        return gap_indices
+    num_bins = max(1, max_points // 2)
+    data_wavelength_um = wavelength_um[data_indices]
+    min_um = data_wavelength_um[0]
+    bandwidth_um = data_wavelength_um[-1] - min_um
+    if bandwidth_um > 0.0:
+        bin_ids = np.floor((data_wavelength_um - min_um) * (num_bins / bandwidth_um)).astype(np.int64)
+        np.clip(bin_ids, 0, num_bins - 1, out=bin_ids)
+    else:
+        bin_ids = np.zeros(len(data_indices), dtype=np.int64)
+    # segments and bins both increase with wavelength, so each group is a contiguous run of data_indices
+    group_keys = segment_ids(flux)[data_indices] * num_bins + bin_ids
+    # sort by flux within each group, the first is the group's minimum and the last is the group's maximum
+    order = np.lexsort((flux[data_indices], group_keys))
+    group_starts = np.flatnonzero(np.concatenate(([True], group_keys[1:] != group_keys[:-1])))
+    group_ends = np.concatenate((group_starts[1:], [len(group_keys)])) - 1
+    selected = np.concatenate((data_indices[order[group_starts]], data_indices[order[group_ends]], gap_indices))
+    return np.unique(selected)
+
+
+def decimate_columns(columns: dict[str, np.ndarray], max_points: int,
+                     wavelength_column: str = 'wavelength_um', flux_column: str = 'flux') -> dict[str, np.ndarray]:
+    """
+    Apply min_max_indices() to a dictionary of spectrum column arrays, all columns are decimated together.
+    """
+    indices = min_max_indices(wavelength_um=columns[wavelength_column], flux=columns[flux_column],
+                              max_points=max_points)
+    if len(indices) == len(columns[wavelength_column]):
+        return columns
+    return {column_name: data_array[indices] for column_name, data_array in columns.items()}
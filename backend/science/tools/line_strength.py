@@ -0,0 +1,43 @@
+"""
+Ranking of HITRAN lines by strength, for choosing which lines to label on a plot.
+
+The strength of an optically thin emission line from gas in LTE at a temperature T is proportional to
+    g_u * A * exp(-E_u / T)
+where g_u is the statistical weight of the upper level, A is the Einstein A coefficient, and E_u is the upper level
+energy in Kelvin (see science.load.hitran). The partition function and the photon energy are the same, or nearly so,
+for all the lines in a plot window, so they are left out; the strengths are only meaningful relative to each other.
+"""
+import numpy as np
+
+default_temperature_k = 1000.0
+
+
+def line_strength(einstein_a: np.ndarray, g_upper: np.ndarray, upper_level_energy_k: np.ndarray,
+                  temperature_k: float = default_temperature_k) -> np.ndarray:
+    """ The relative LTE emission strength of each line, see the module docstring. """
+    return g_upper * einstein_a * np.exp(-upper_level_energy_k / temperature_k)
+
+
+def strongest_per_bin(wavelength_um: np.ndarray, strength: np.ndarray, min_um: float, max_um: float,
+                      num_bins: int) -> np.ndarray:
+    """
+    Indices, in wavelength order, of the strongest line in each of num_bins bins of equal wavelength width
+    between min_um and max_um. Lines outside the window are never selected.
+
+    wavelength_um must be sorted.
+    """
+    start = int(np.searchsorted(wavelength_um, min_um, side='left'))
+    stop = int(np.searchsorted(wavelength_um, max_um, side='right'))
+    if stop <= start:
+        return np.arange(0, dtype=np.int64)
+    window_wavelength_um = wavelength_um[start:stop]
+    bandwidth_um = max_um - min_um
+    if bandwidth_um > 0.0:
+        bin_ids = np.floor((window_wavelength_um - min_um) * (num_bins / bandwidth_um)).astype(np.int64)
+        np.clip(bin_ids, 0, num_bins - 1, out=bin_ids)
+    else:
+        bin_ids = np.zeros(stop - start, dtype=np.int64)
+    # the bins increase with wavelength, sort by decreasing strength within each bin, the first is the strongest
+    order = np.lexsort((-strength[start:stop], bin_ids))
+    bin_starts = np.flatnonzero(np.concatenate(([True], bin_ids[1:] != bin_ids[:-1])))
+    return np.sort(order[bin_starts]) + start
@@ -0,0 +1,74 @@
+"""
+A simple equal-area-ish spatial index of the sky for cone searches.
+
+The sky is cut into declination bands of band_height_deg, and each band into right ascension buckets that are about
+band_height_deg wide on the sky (fewer buckets near the poles). Each position has one integer bucket id, stored with
+the position in the sky_index table. A cone search reads the positions in the buckets that could overlap the cone,
+then keeps the positions within the radius, using the haversine distance.
+"""
+import numpy as np
+
+from science.tools.coordinates import haversine, degToRad, rad_to_deg
+
+band_height_deg = 1.0
+num_bands = int(np.ceil(180.0 / band_height_deg))
+
+
+def ra_buckets_per_band() -> np.ndarray:
+    # the edge of each band nearest to the equator sets the number of buckets
+    band_lower_dec_deg = -90.0 + band_height_deg * np.arange(num_bands)
+    band_upper_dec_deg = band_lower_dec_deg + band_height_deg
+    widest_dec_deg = np.where(band_lower_dec_deg * band_upper_dec_deg <= 0.0, 0.0,
+                              np.minimum(np.abs(band_lower_dec_deg), np.abs(band_upper_dec_deg)))
+    return np.maximum(1, np.ceil(360.0 * np.cos(widest_dec_deg * degToRad) / band_height_deg)).astype(np.int64)
+
+
+num_ra_buckets = ra_buckets_per_band()
+# the bucket id of the first bucket in each band
+band_offsets = np.concatenate(([0], np.cumsum(num_ra_buckets)[:-1]))
+
+
+def dec_band(dec_deg):
+    return np.clip(np.floor((np.asarray(dec_deg) + 90.0) / band_height_deg).astype(np.int64), 0, num_bands - 1)
+
+
+def sky_bucket_id(ra_deg, dec_deg):
+    """ The bucket id(s) of the position(s), ra_deg and dec_deg can be floats or arrays. """
+    band = dec_band(dec_deg)
+    buckets_this_band = num_ra_buckets[band]
+    ra_bucket = np.floor((np.asarray(ra_deg) % 360.0) * buckets_this_band / 360.0).astype(np.int64)
+    return band_offsets[band] + np.minimum(ra_bucket, buckets_this_band - 1)
+
+
+def cone_bucket_ids(ra_deg: float, dec_deg: float, radius_deg: float) -> list[int]:
+    """ All the bucket ids that could contain a position within radius_deg of (ra_deg, dec_deg). """
+    bucket_ids = []
+    min_dec_deg = max(-90.0, dec_deg - radius_deg)
+    max_dec_deg = min(90.0, dec_deg + radius_deg)
+    # the cone is widest in right ascension at the declination furthest from the equator
+    extreme_dec_deg = max(abs(min_dec_deg), abs(max_dec_deg))
+    cos_extreme_dec = np.cos(extreme_dec_deg * degToRad)
+    sin_radius = np.sin(radius_deg * degToRad)
+    if cos_extreme_dec <= sin_radius:
+        # the cone includes a pole, or gets close enough that every right ascension is possible
+        half_width_ra_deg = 180.0
+    else:
+        half_width_ra_deg = np.arcsin(sin_radius / cos_extreme_dec) * rad_to_deg
+    for band in range(int(dec_band(min_dec_deg)), int(dec_band(max_dec_deg)) + 1):
+        buckets_this_band = int(num_ra_buckets[band])
+        if half_width_ra_deg >= 180.0:
+            ra_buckets = range(buckets_this_band)
+        else:
+            bucket_width_deg = 360.0 / buckets_this_band
+            first_bucket = int(np.floor((ra_deg - half_width_ra_deg) / bucket_width_deg))
+            last_bucket = int(np.floor((ra_deg + half_width_ra_deg) / bucket_width_deg))
+            # wrap around RA = 0, without repeating buckets when the cone is wider than the band
+            ra_buckets = sorted({bucket % buckets_this_band for bucket in range(first_bucket, last_bucket + 1)})
+        bucket_ids.extend(int(band_offsets[band]) + ra_bucket for ra_bucket in ra_buckets)
+    return bucket_ids
+
+
+def angular_distance_deg(ra_deg: float, dec_deg: float, ras_deg: np.ndarray, decs_deg: np.ndarray) -> np.ndarray:
+    """ The great circle distances, in degrees, from (ra_deg, dec_deg) to each of (ras_deg, decs_deg). """
+    return haversine((ra_deg * degToRad, dec_deg * degToRad),
+                     (np.asarray(ras_deg) * degToRad, np.asarray(decs_deg) * degToRad)) * rad_to_deg